@@ -102,6 +102,38 @@ WORKING_DAYS = "Mon Tue Wed Thu Sun"
 # Alert users before number of days of engagement start date
 ALERT_ENG_DAYS = 7
 
+# Minutes to coalesce notifications for users who opted in to email digests
+# (flushed by the send_notification_digests management command)
+NOTIFICATION_DIGEST_WINDOW_MINUTES = 10
+
+# Report downloads: set to True when nginx serves report files from the
+# internal location in nginx.conf, so Django only authorizes the request
+REPORT_DOWNLOAD_X_ACCEL = False
+REPORT_DOWNLOAD_X_ACCEL_LOCATION = '/protected-media/'
+
+# Chunked report uploads: largest accepted chunk, largest report, and where
+# partial uploads are kept until they are finalized
+REPORT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+REPORT_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+REPORT_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'upload_tmp')
+# Hours after its last chunk an unfinished upload is discarded
+REPORT_UPLOAD_TTL_HOURS = 24
+
+# Per-request SQL counting (Server-Timing header, per-view report at /api/sql-report/),
+# a SELECT repeated more than SQL_N_PLUS_ONE_THRESHOLD times in a request is logged as a likely N+1
+SQL_INSTRUMENTATION = True
+SQL_N_PLUS_ONE_THRESHOLD = 10
+# Send the Server-Timing header to every client, not only to staff users
+SQL_SERVER_TIMING = False
+
+# Prometheus metrics at /metrics: workers fold their counts into METRICS_FILE every
+# METRICS_FLUSH_INTERVAL seconds; scrapers must come from METRICS_ALLOWED_IPS or send
+# "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_FILE = os.path.join(BASE_DIR, 'metrics', 'metrics.json')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -120,11 +152,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'CalendarinhoApp.metrics.MetricsMiddleware',
+    'CalendarinhoApp.sql_instrumentation.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'CalendarinhoApp.request_memo.RequestMemoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -3,7 +3,7 @@ Production settings for Calendarinho project.
 """
 from .base import *
 
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '').split(',')
 
 # Security settings
@@ -18,6 +18,9 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = os.environ.get('SECURE_HSTS_INCLUDE_SUBDOMAINS'
 SECURE_HSTS_PRELOAD = os.environ.get('SECURE_HSTS_PRELOAD', 'False').lower() == 'true'
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', 'https://localhost').split(',')
 
+# Let nginx stream report downloads (see /protected-media/ in nginx.conf)
+REPORT_DOWNLOAD_X_ACCEL = os.environ.get('REPORT_DOWNLOAD_X_ACCEL', 'False').lower() == 'true'
+
 # Database
 DATABASES = {
     'default': {
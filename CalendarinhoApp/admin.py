@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.core.exceptions import ValidationError
 from threading import Thread
 
-from .models import Employee, Engagement, Leave, Client, Service, Comment, ProjectManager, Report, Vulnerability
+from .models import Employee, Engagement, Leave, Client, Service, Comment, ProjectManager, Report, Vulnerability, SLAPolicy, Holiday
 from .employee import notifyManagersNewLeave
 from .engagement import notifyEngagedEmployees, notifyManagersNewEngagement
 
@@ -123,3 +123,21 @@ class VulnerabilityAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Vulnerability, VulnerabilityAdmin)
+
+
+class SLAPolicyAdmin(admin.ModelAdmin):
+    list_display = ('severity', 'days', 'client', 'service_type', 'updated_at')
+    list_filter = ('severity', 'service_type', 'client')
+    search_fields = ('client__name', 'service_type__name')
+
+
+admin.site.register(SLAPolicy, SLAPolicyAdmin)
+
+
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('name', 'date')
+    list_filter = ('date',)
+    search_fields = ('name',)
+
+
+admin.site.register(Holiday, HolidayAdmin)
@@ -7,7 +7,7 @@ data structures for the enhanced UI components.
 
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count, Max, Min, Avg
+from django.db.models import Q, Count, Max, Min, Avg, Case, When, Value, IntegerField
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.decorators.http import require_http_methods
@@ -586,26 +586,12 @@ def api_vulnerabilities_filtered(request):
     if filters.get('fixed_to'):
         queryset = queryset.filter(fixed_at__date__lte=filters['fixed_to'])
     
+    # SLA due date, days remaining and overdue flag come from the SLA policies, computed in SQL
+    queryset = queryset.with_sla()
+
     # Overdue filter
     if filters.get('overdue_only'):
-        today = timezone.now().date()
-        severity_sla = {
-            'Critical': 7,
-            'High': 30,
-            'Medium': 90,
-            'Low': 180
-        }
-        
-        overdue_conditions = Q()
-        for severity, days in severity_sla.items():
-            cutoff_date = today - timezone.timedelta(days=days)
-            overdue_conditions |= Q(
-                severity=severity,
-                status='Open',
-                created_at__date__lte=cutoff_date
-            )
-        
-        queryset = queryset.filter(overdue_conditions)
+        queryset = queryset.filter(sla_overdue=True)
     
     # Sort options
     sort_by = request.GET.get('sort_by', 'created_at')
@@ -614,11 +600,12 @@ def api_vulnerabilities_filtered(request):
     
     # Custom sorting for severity and related names
     if sort_by == 'severity':
-        severity_order = {'Critical': 1, 'High': 2, 'Medium': 3, 'Low': 4}
-        if sort_order == 'desc':
-            queryset = sorted(queryset, key=lambda v: severity_order.get(v.severity, 5))
-        else:
-            queryset = sorted(queryset, key=lambda v: severity_order.get(v.severity, 5), reverse=True)
+        # Descending puts Critical first
+        severity_rank = Case(
+            *[When(severity=severity, then=Value(rank)) for rank, severity in enumerate(['Critical', 'High', 'Medium', 'Low'])],
+            default=Value(4), output_field=IntegerField(),
+        )
+        queryset = queryset.order_by(severity_rank if sort_order == 'desc' else severity_rank.desc(), '-created_at')
     elif sort_by in ['engagement_name', 'engagement__name']:
         queryset = queryset.order_by(f"{order_prefix}engagement__name")
     elif sort_by in ['client_name', 'engagement__client__name']:
@@ -646,7 +633,9 @@ def api_vulnerabilities_filtered(request):
             'expected_fix_date': vuln.expected_fix_date.isoformat() if getattr(vuln, 'expected_fix_date', None) else None,
             'severity_color': vuln.get_severity_color(),
             'severity_icon': vuln.get_severity_icon(),
-            'is_overdue': vuln.is_overdue(),
+            'is_overdue': vuln.sla_overdue,
+            'sla_due_date': vuln.sla_due_date.isoformat(),
+            'days_remaining': vuln.days_remaining.days if vuln.status == 'Open' else None,
             'days_to_fix': vuln.days_to_fix(),
         }
         vulnerabilities_data.append(vuln_data)
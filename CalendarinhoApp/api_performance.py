@@ -17,6 +17,7 @@ import json
 from typing import Dict, List, Any, Optional
 
 from .models import Engagement, Client, Vulnerability
+from .metrics import CACHE_HITS, CACHE_MISSES
 from users.models import CustomUser as Employee
 
 
@@ -31,8 +32,10 @@ def get_cached_or_compute(cache_key: str, compute_func, timeout: int = 300):
     """Get data from cache or compute it if not cached"""
     cached_data = cache.get(cache_key)
     if cached_data is not None:
+        CACHE_HITS.inc(cache='api')
         return cached_data
     
+    CACHE_MISSES.inc(cache='api')
     data = compute_func()
     cache.set(cache_key, data, timeout)
     return data
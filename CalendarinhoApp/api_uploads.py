@@ -0,0 +1,247 @@
+"""
+Chunked, resumable report upload API
+A client opens an upload, PUTs sequential chunks (resuming from the received offset after a failure)
+and finalizes it, at which point the SHA-256 is verified and the Report row is created
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+from threading import Thread
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .models import Engagement, Report, ReportUpload
+from .engagement import notifyNewReportUpload
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class _HashingReader:
+    """File-like wrapper that feeds everything read through a SHA-256 digest."""
+
+    def __init__(self, fileobj, size):
+        self.fileobj = fileobj
+        self.size = size
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def upload_temp_path(upload):
+    """Location of the partial file for an upload in the temp area."""
+    return os.path.join(settings.REPORT_UPLOAD_TEMP_DIR, f"{upload.id}.part")
+
+
+def upload_state(upload):
+    return {
+        'upload_id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'received': upload.received,
+        'chunk_size': settings.REPORT_UPLOAD_CHUNK_SIZE,
+        'complete': upload.received == upload.size,
+    }
+
+
+def error_response(message, status=400, **extra):
+    return JsonResponse({'success': False, 'error': message, **extra}, status=status)
+
+
+def discard_upload(upload):
+    try:
+        os.remove(upload_temp_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_stale_uploads():
+    """Discard uploads untouched for REPORT_UPLOAD_TTL_HOURS and orphaned partial files as old
+
+    Returns the number of uploads discarded.
+    """
+    cutoff = timezone.now() - datetime.timedelta(hours=settings.REPORT_UPLOAD_TTL_HOURS)
+    stale = list(ReportUpload.objects.filter(updated_at__lt=cutoff))
+    for upload in stale:
+        discard_upload(upload)
+
+    known = {f"{upload_id}.part" for upload_id in ReportUpload.objects.values_list('id', flat=True)}
+    try:
+        entries = list(os.scandir(settings.REPORT_UPLOAD_TEMP_DIR))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        if (entry.name.endswith('.part') and entry.name not in known
+                and entry.stat().st_mtime < cutoff.timestamp()):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return len(stale)
+
+
+def get_user_upload(request, upload_id):
+    return get_object_or_404(ReportUpload, id=upload_id, user=request.user)
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_report_upload_init(request, eng_id):
+    """Open a chunked upload: JSON body with filename, size, report_type and optional note and sha256"""
+    eng = get_object_or_404(Engagement, id=eng_id)
+    try:
+        data = json.loads(request.body)
+        size = int(data.get('size'))
+    except (ValueError, TypeError):
+        return error_response("Invalid JSON body or size")
+
+    filename = os.path.basename(str(data.get('filename') or '')).strip()
+    report_type = data.get('report_type') or "Draft"
+    sha256 = (data.get('sha256') or '').lower()
+    note = data.get('note') or None
+
+    if not filename:
+        return error_response("Filename is required")
+    if size <= 0 or size > settings.REPORT_UPLOAD_MAX_SIZE:
+        return error_response(f"Size must be between 1 and {settings.REPORT_UPLOAD_MAX_SIZE} bytes")
+    if report_type not in dict(Report.REPORT_TYPES):
+        return error_response("Invalid report type")
+    if sha256 and not SHA256_RE.match(sha256):
+        return error_response("sha256 must be a hex encoded SHA-256 digest")
+    if note and len(note) > 60:
+        return error_response("Note must be at most 60 characters")
+
+    # Abandoned uploads are cleaned up as new ones start (and by purge_report_uploads)
+    purge_stale_uploads()
+    upload = ReportUpload.objects.create(engagement=eng, user=request.user, filename=filename,
+                                         report_type=report_type, note=note, size=size, sha256=sha256)
+    os.makedirs(settings.REPORT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(upload_temp_path(upload), 'wb').close()
+
+    return JsonResponse({'success': True, **upload_state(upload)}, status=201)
+
+
+@login_required
+@require_http_methods(["GET", "DELETE"])
+def api_report_upload_status(request, upload_id):
+    """GET returns the received offset to resume from, DELETE aborts the upload"""
+    upload = get_user_upload(request, upload_id)
+    if request.method == 'DELETE':
+        discard_upload(upload)
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': True, **upload_state(upload)})
+
+
+@login_required
+@require_http_methods(["PUT"])
+def api_report_upload_chunk(request, upload_id):
+    """Append one chunk; the body is the raw bytes and Content-Range gives its position
+
+    Chunks must arrive in order, a chunk at any other offset than the received
+    one is rejected with 409 and the offset to resume from. An optional
+    X-Chunk-SHA256 header is checked against the bytes written.
+    """
+    upload = get_user_upload(request, upload_id)
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return error_response("Content-Range header of the form 'bytes start-end/total' is required")
+
+    start, end, total = (int(value) for value in match.groups())
+    length = end - start + 1
+    if total != upload.size or end < start or end >= upload.size:
+        return error_response("Content-Range does not match the upload size")
+    if length > settings.REPORT_UPLOAD_CHUNK_SIZE:
+        return error_response(f"Chunks are limited to {settings.REPORT_UPLOAD_CHUNK_SIZE} bytes")
+    if start != upload.received:
+        return error_response("Chunk does not start at the received offset", status=409, **upload_state(upload))
+
+    # Stream the body to disk in small blocks, hashing as we go, instead of loading request.body
+    chunk_digest = hashlib.sha256()
+    written = 0
+    path = upload_temp_path(upload)
+    with open(path, 'r+b') as part:
+        part.seek(start)
+        while written < length:
+            block = request.read(min(READ_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            chunk_digest.update(block)
+            written += len(block)
+        part.truncate(start + written)
+
+    expected = request.headers.get('X-Chunk-SHA256', '').lower()
+    if written != length or (expected and expected != chunk_digest.hexdigest()):
+        # Drop the partial chunk so the client can resend it from the same offset
+        with open(path, 'r+b') as part:
+            part.truncate(start)
+        return error_response("Chunk was incomplete or failed its checksum", **upload_state(upload))
+
+    upload.received = start + written
+    upload.save(update_fields=['received', 'updated_at'])
+    return JsonResponse({'success': True, 'chunk_sha256': chunk_digest.hexdigest(), **upload_state(upload)})
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_report_upload_finalize(request, upload_id):
+    """Verify the assembled file and create the Report; the sha256 may also be given here"""
+    upload = get_user_upload(request, upload_id)
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else {}
+    except ValueError:
+        return error_response("Invalid JSON body")
+
+    expected = (data.get('sha256') or upload.sha256).lower()
+    if upload.received != upload.size:
+        return error_response("Upload is incomplete", **upload_state(upload))
+
+    # The SHA-256 is computed while the temp file is copied into report storage in one pass
+    report = Report(engagement=upload.engagement, user=upload.user,
+                    report_type=upload.report_type, note=upload.note)
+    # Held from storing the blob until the row references it, see Report.save
+    with report.file.storage.blob_lock():
+        with open(upload_temp_path(upload), 'rb') as part:
+            reader = _HashingReader(part, upload.size)
+            report.file.save(upload.filename, File(reader, name=upload.filename), save=False)
+
+        sha256 = reader.hexdigest()
+        mismatch = expected and expected != sha256
+        if mismatch:
+            Report.delete_unreferenced_file(report.file.name)
+        else:
+            report.save()
+    discard_upload(upload)
+    if mismatch:
+        return error_response("SHA-256 mismatch, the upload has been discarded", sha256=sha256)
+
+    thread = Thread(target=notifyNewReportUpload, args=(report, request))
+    thread.start()
+
+    return JsonResponse({
+        'success': True,
+        'reference': report.reference,
+        'sha256': sha256,
+        'download_url': reverse('CalendarinhoApp:downloadReport', args=[report.reference]),
+    }, status=201)
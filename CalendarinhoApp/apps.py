@@ -3,4 +3,6 @@ from django.apps import AppConfig
 
 class CalendarinhoAppConfig(AppConfig):
     name = 'CalendarinhoApp'
-        
\ No newline at end of file
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,67 @@
+"""
+Business-day calendar built from settings.WORKING_DAYS and the Holiday table
+The numpy.busdaycalendar is built once per process and rebuilt when holidays change
+(in this process through the Holiday signals, in other workers after BUSDAY_CALENDAR_TTL)
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+# Seconds before another worker process picks up holiday changes
+BUSDAY_CALENDAR_TTL = 300
+
+_lock = threading.Lock()
+_calendar = None
+_built_at = 0
+
+
+def get_busdaycalendar():
+    """The cached numpy.busdaycalendar for the working week and holidays"""
+    global _calendar, _built_at
+    calendar = _calendar
+    if calendar is not None and time.monotonic() - _built_at < BUSDAY_CALENDAR_TTL:
+        return calendar
+
+    from .models import Holiday
+    with _lock:
+        if _calendar is None or time.monotonic() - _built_at >= BUSDAY_CALENDAR_TTL:
+            holidays = list(Holiday.objects.values_list('date', flat=True))
+            _calendar = np.busdaycalendar(weekmask=settings.WORKING_DAYS,
+                                          holidays=np.array(holidays, dtype='datetime64[D]'))
+            _built_at = time.monotonic()
+        return _calendar
+
+
+def clear_busdaycalendar():
+    global _calendar
+    _calendar = None
+
+
+def busday_count(starts, ends):
+    """Working days from start to end, both inclusive, for dates or arrays of dates
+
+    Empty (end before start) ranges count as zero. Returns an int for scalar
+    arguments and a numpy array otherwise.
+    """
+    starts = np.asarray(starts, dtype='datetime64[D]')
+    ends = np.asarray(ends, dtype='datetime64[D]') + 1
+    counts = np.maximum(np.busday_count(starts, ends, busdaycal=get_busdaycalendar()), 0)
+    return int(counts) if counts.ndim == 0 else counts
+
+
+def is_busday(dates):
+    """Whether each date is a working day"""
+    return np.is_busday(np.asarray(dates, dtype='datetime64[D]'), busdaycal=get_busdaycalendar())
+
+
+def clipped_busday_count(spans, start_date, end_date):
+    """Total working days of (start, end) spans that fall between start_date and end_date"""
+    spans = list(spans)
+    if not spans:
+        return 0
+    starts = np.maximum(np.array([span[0] for span in spans], dtype='datetime64[D]'), np.datetime64(start_date, 'D'))
+    ends = np.minimum(np.array([span[1] for span in spans], dtype='datetime64[D]'), np.datetime64(end_date, 'D'))
+    return int(busday_count(starts, ends).sum())
@@ -0,0 +1,140 @@
+"""
+FullCalendar JSON event feeds
+The calendars fetch the events overlapping the visible window (FullCalendar's start and
+end parameters, end exclusive) as users navigate, instead of embedding every engagement
+and leave ever recorded in the page
+"""
+
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_http_methods
+
+from .models import Engagement, Leave
+
+# Employees calendar: engagements in one color, leaves by type
+EMPLOYEE_ENGAGEMENT_COLOR = "#BD4932"
+
+# Seconds browsers may reuse a fetched window before asking again
+EVENT_FEED_MAX_AGE = 60
+# Longest window one request may ask for, a year view plus its padding weeks
+EVENT_FEED_MAX_DAYS = 400
+
+
+def feed_window(request):
+    """The requested [start, end) dates, FullCalendar sends ISO dates or datetimes"""
+    start_date = datetime.date.fromisoformat(request.GET.get('start', '')[:10])
+    end_date = datetime.date.fromisoformat(request.GET.get('end', '')[:10])
+    if end_date <= start_date or (end_date - start_date).days > EVENT_FEED_MAX_DAYS:
+        raise ValueError("Invalid window")
+    return start_date, end_date
+
+
+def engagement_events(start_date, end_date, employee_ids=None):
+    """Engagements overlapping the [start, end) window as FullCalendar events"""
+    engagements = Engagement.objects.filter(start_date__lt=end_date, end_date__gte=start_date)
+    if employee_ids is not None:
+        engagements = engagements.filter(employees__in=employee_ids).distinct()
+    colors = Engagement.CALENDAR_COLORS
+    return [{
+        'id': eng.id,
+        'title': f"{eng.name} -- {eng.service_type}",
+        'start': eng.start_date,
+        'end': eng.end_date + datetime.timedelta(days=1),
+        'url': reverse('CalendarinhoApp:engagement', args=[eng.id]),
+        'backgroundColor': colors[eng.id % len(colors)],
+        'borderColor': 'white',
+    } for eng in engagements.select_related('service_type').order_by('start_date', 'id')]
+
+
+def leave_events(start_date, end_date, employee_ids=None):
+    """Leaves overlapping the [start, end) window as FullCalendar events"""
+    leaves = Leave.objects.filter(start_date__lt=end_date, end_date__gte=start_date)
+    if employee_ids is not None:
+        leaves = leaves.filter(employee_id__in=employee_ids)
+    return [{
+        'id': leave.id,
+        'title': f"{leave.employee.first_name} {leave.employee.last_name} - {leave.note} - {leave.leave_type}",
+        'start': leave.start_date,
+        'end': leave.end_date + datetime.timedelta(days=1),
+        'backgroundColor': Leave.CALENDAR_COLORS.get(leave.leave_type, "#2C3E50"),
+        'borderColor': 'white',
+        'textColor': 'white',
+    } for leave in leaves.select_related('employee').order_by('start_date', 'id')]
+
+
+def employee_calendar_events(start_date, end_date, employee_ids):
+    """Engagements and leaves of the employees overlapping the [start, end) window as one event stream
+
+    Two queries however many employees are selected. Each engagement is
+    listed once, titled with the selected employees on it.
+    """
+    employee_ids = list(employee_ids)
+    if not employee_ids:
+        return []
+
+    # The employees__in join is reused for the names, so only selected employees are listed
+    engagements = {}
+    for eng_id, name, service_name, eng_start, eng_end, first_name, last_name in Engagement.objects.order_by(
+        'start_date', 'id', 'employees__first_name', 'employees__last_name',
+    ).filter(employees__in=employee_ids, start_date__lt=end_date, end_date__gte=start_date).values_list(
+        'id', 'name', 'service_type__name', 'start_date', 'end_date', 'employees__first_name', 'employees__last_name',
+    ):
+        engagement = engagements.setdefault(eng_id, {'name': f"{name} - {service_name}", 'start': eng_start,
+                                                     'end': eng_end, 'employees': []})
+        engagement['employees'].append(f"{first_name} {last_name}")
+
+    events = [{
+        'id': f"engagement-{eng_id}",
+        'title': f"{', '.join(engagement['employees'])} :-\n {engagement['name']}",
+        'start': engagement['start'],
+        'end': engagement['end'] + datetime.timedelta(days=1),
+        'url': reverse('CalendarinhoApp:engagement', args=[eng_id]),
+        'backgroundColor': EMPLOYEE_ENGAGEMENT_COLOR,
+        'borderColor': 'white',
+        'textColor': 'white',
+    } for eng_id, engagement in engagements.items()]
+    events += [
+        dict(event, id=f"leave-{event['id']}")
+        for event in leave_events(start_date, end_date, employee_ids)
+    ]
+    return sorted(events, key=lambda event: event['start'])
+
+
+def event_feed(request, events):
+    try:
+        start_date, end_date = feed_window(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid or too long start/end window'}, status=400)
+    return JsonResponse(events(start_date, end_date), safe=False)
+
+
+@login_required
+@require_http_methods(["GET"])
+@cache_control(private=True, max_age=EVENT_FEED_MAX_AGE)
+def api_engagement_events(request):
+    """Engagements between ?start and ?end for the engagements calendar"""
+    return event_feed(request, engagement_events)
+
+
+@login_required
+@require_http_methods(["GET"])
+@cache_control(private=True, max_age=EVENT_FEED_MAX_AGE)
+def api_leave_events(request):
+    """Leaves of every employee between ?start and ?end for the leaves calendar"""
+    return event_feed(request, leave_events)
+
+
+@login_required
+@require_http_methods(["GET"])
+@cache_control(private=True, max_age=EVENT_FEED_MAX_AGE)
+def api_employee_events(request):
+    """Engagements and leaves of the employees in ?emps (comma separated ids) between ?start and ?end"""
+    try:
+        employee_ids = {int(value) for value in request.GET.get('emps', '').split(',') if value.strip()}
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid employee id'}, status=400)
+    return event_feed(request, lambda start_date, end_date: employee_calendar_events(start_date, end_date, employee_ids))
@@ -0,0 +1,174 @@
+"""
+Sweep-line detection of double bookings
+Engagement assignments and leaves in a window are loaded once and each employee's
+bookings are swept in start order, so only bookings that really overlap are compared
+"""
+
+import datetime
+import heapq
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+
+from .models import Engagement, Leave
+from users.models import CustomUser as Employee
+
+ONE_DAY = datetime.timedelta(days=1)
+
+Booking = namedtuple('Booking', ['kind', 'id', 'name', 'start_date', 'end_date'])
+
+
+def booking_data(booking):
+    return {
+        'type': booking.kind,
+        'id': booking.id,
+        'name': booking.name,
+        'start_date': booking.start_date,
+        'end_date': booking.end_date,
+    }
+
+
+def sweep_overlaps(bookings):
+    """Overlapping pairs of bookings (inclusive dates) and the peak number booked on one day.
+
+    Bookings are visited in start order while a heap keyed on end date holds
+    the ones still running, so n bookings with k overlapping pairs cost
+    O((n + k) log n). Returns (pairs, peak, peak_date), each pair being
+    (earlier, later, overlap_start, overlap_end).
+    """
+    ordered = sorted(bookings, key=lambda booking: (booking.start_date, booking.end_date))
+    active = []
+    pairs = []
+    peak, peak_date = 0, None
+    for index, booking in enumerate(ordered):
+        while active and active[0][0] < booking.start_date:
+            heapq.heappop(active)
+        # Everything still active started earlier and ends on or after this start
+        for end_date, other in active:
+            pairs.append((ordered[other], booking, booking.start_date, min(end_date, booking.end_date)))
+        heapq.heappush(active, (booking.end_date, index))
+        if len(active) > peak:
+            peak, peak_date = len(active), booking.start_date
+    return pairs, peak, peak_date
+
+
+def concurrency_steps(intervals):
+    """Step function of how many (start, end) intervals are running: sorted (date, count) changes"""
+    deltas = defaultdict(int)
+    for start_date, end_date in intervals:
+        deltas[start_date] += 1
+        deltas[end_date + ONE_DAY] -= 1
+    steps, running = [], 0
+    for day in sorted(deltas):
+        running += deltas[day]
+        steps.append((day, running))
+    return steps
+
+
+class ConflictReport:
+    """Double bookings and engagement concurrency between two dates.
+
+    Built from four queries: engagement assignments, leaves, names of the
+    employees with more than one booking and engagements overlapping the
+    window. Bookings are clipped to the window.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+
+        bookings = defaultdict(list)
+        assignments = Engagement.objects.order_by().filter(
+            employees__isnull=False, start_date__lte=end_date, end_date__gte=start_date,
+        ).values_list('employees', 'id', 'name', 'start_date', 'end_date')
+        for employee_id, eng_id, name, eng_start, eng_end in assignments:
+            bookings[employee_id].append(self.clip(Booking('engagement', eng_id, name, eng_start, eng_end)))
+
+        leaves = Leave.objects.order_by().filter(
+            start_date__lte=end_date, end_date__gte=start_date,
+        ).values_list('employee_id', 'id', 'leave_type', 'start_date', 'end_date')
+        for employee_id, leave_id, leave_type, leave_start, leave_end in leaves:
+            bookings[employee_id].append(self.clip(Booking('leave', leave_id, leave_type, leave_start, leave_end)))
+
+        self.names = names = {
+            emp_id: f"{first_name} {last_name}".strip()
+            for emp_id, first_name, last_name in Employee.objects.filter(id__in=[
+                employee_id for employee_id, employee_bookings in bookings.items() if len(employee_bookings) > 1
+            ]).values_list('id', 'first_name', 'last_name')
+        }
+
+        # Overlaps per employee, leave against leave is not a double booking
+        self.double_bookings = []
+        self.by_engagement = defaultdict(lambda: defaultdict(list))
+        for employee_id, employee_bookings in bookings.items():
+            if len(employee_bookings) < 2:
+                continue
+            pairs, peak, peak_date = sweep_overlaps(employee_bookings)
+            overlaps = []
+            for first, second, overlap_start, overlap_end in pairs:
+                if first.kind == second.kind == 'leave':
+                    continue
+                overlaps.append({
+                    'first': booking_data(first),
+                    'second': booking_data(second),
+                    'start_date': overlap_start,
+                    'end_date': overlap_end,
+                    'days': (overlap_end - overlap_start).days + 1,
+                })
+                for booking, other in ((first, second), (second, first)):
+                    if booking.kind == 'engagement':
+                        self.by_engagement[booking.id][employee_id].append({
+                            **booking_data(other),
+                            'overlap_start': overlap_start,
+                            'overlap_end': overlap_end,
+                        })
+            if overlaps:
+                self.double_bookings.append({
+                    'employee_id': employee_id,
+                    'employee_name': names.get(employee_id, ''),
+                    'peak_concurrency': peak,
+                    'peak_date': peak_date,
+                    'overlaps': overlaps,
+                })
+
+        engagements = Engagement.objects.order_by().filter(
+            start_date__lte=end_date, end_date__gte=start_date,
+        ).values_list('start_date', 'end_date')
+        self.steps = concurrency_steps(
+            (max(eng_start, start_date), min(eng_end, end_date)) for eng_start, eng_end in engagements
+        )
+        self.step_days = [day for day, _ in self.steps]
+
+    def clip(self, booking):
+        return booking._replace(start_date=max(booking.start_date, self.start_date),
+                                end_date=min(booking.end_date, self.end_date))
+
+    def engagement_conflicts(self, engagement_id):
+        """Employees double booked on an engagement, with the bookings and dates it clashes with"""
+        return [
+            {'employee_id': employee_id, 'employee_name': self.names.get(employee_id, ''), 'overlaps': overlaps}
+            for employee_id, overlaps in self.by_engagement.get(engagement_id, {}).items()
+        ]
+
+    def peak_concurrency(self, start_date, end_date):
+        """Most engagements running on one day between the dates and the first such day"""
+        index = max(bisect_right(self.step_days, start_date) - 1, 0)
+        peak, peak_date = 0, None
+        while index < len(self.steps) and self.steps[index][0] <= end_date:
+            day, running = self.steps[index]
+            if running > peak:
+                peak, peak_date = running, max(day, start_date)
+            index += 1
+        return peak, peak_date
+
+    def daily_concurrency(self):
+        """Number of engagements running on every day of the window"""
+        days = []
+        index, running = 0, 0
+        day = self.start_date
+        while day <= self.end_date:
+            while index < len(self.steps) and self.steps[index][0] <= day:
+                running = self.steps[index][1]
+                index += 1
+            days.append({'date': day, 'engagements': running})
+            day += ONE_DAY
+        return days
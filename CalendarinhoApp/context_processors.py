@@ -4,19 +4,22 @@ from .forms import LeaveForm, EngagementForm, ClientForm, ServiceForm
 from django.conf import settings
 
 def alertUpcomingEngagements(request):
-    todayDatetime = datetime.date.today()
-    todayDate = datetime.date(
-        todayDatetime.year, todayDatetime.month, todayDatetime.day)
-    engs = Engagement.objects.filter(start_date__gt=str(todayDate))
+    todayDate = datetime.date.today()
     alertEngagements = []
+    if not request.user.is_authenticated:
+        return {'alertEngagements': alertEngagements}
+    # Only the user's engagements starting within ALERT_ENG_DAYS, in one query
+    engs = Engagement.objects.filter(
+        employees=request.user.id,
+        start_date__gt=todayDate,
+        start_date__lte=todayDate + datetime.timedelta(days=settings.ALERT_ENG_DAYS),
+    ).order_by('start_date')
     endWithDays = {}
     for eng in engs:
-        numDaysLeft = eng.days_left_to_start()
         #Alert engaged users before starting
-        if (numDaysLeft <= settings.ALERT_ENG_DAYS and eng.employees.filter(id=request.user.id)):
-            endWithDays['eng'] = eng
-            endWithDays['days'] = numDaysLeft
-            alertEngagements.append(endWithDays.copy())
+        endWithDays['eng'] = eng
+        endWithDays['days'] = eng.days_left_to_start()
+        alertEngagements.append(endWithDays.copy())
 
     context = {
         'alertEngagements': alertEngagements
@@ -1,13 +1,22 @@
 from django.conf import settings
-from .models import Employee, OTP
+from .models import Employee, OTP, PendingNotification
+from .metrics import NOTIFICATIONS_SENT, track_notification_send
+from django.core import mail
 from django.core.mail import EmailMessage
 from django.template import loader
+from django.utils.html import conditional_escape
 from django.contrib.sites.shortcuts import get_current_site
 import logging
 from random import randint
 import ssl
+from smtplib import SMTPException
 from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
 from django.utils.functional import cached_property
+import uuid
+import datetime
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +66,144 @@ def send_email(recipient_email, subject, otp, request):
     email = EmailMessage(subject, email_body, to=recipient_list)
     email.content_subtype = "html"
     try:
-        email.send()
-    except ConnectionRefusedError as e:
+        with track_notification_send('otp'):
+            NOTIFICATIONS_SENT.inc(email.send(), kind='otp')
+    except (SMTPException, OSError) as e:
         logger.error("Failed to send emails: \n" + str(e))
 
+
+def render_fan_out_template(template_name, context, recipient_fields):
+    """Render an email template once for many recipients.
+
+    Every key in recipient_fields is rendered as a unique placeholder token, so
+    the expensive template render happens a single time. The returned function
+    takes a dict of per-recipient values and swaps them into the shared body.
+    Per-recipient fields must be output plainly in the template (no filters).
+    """
+    tokens = {key: f"[[fanout:{key}:{uuid.uuid4().hex}]]" for key in recipient_fields}
+    shared_body = loader.render_to_string(template_name, {**context, **tokens})
+
+    def personalise(values):
+        body = shared_body
+        for key, token in tokens.items():
+            body = body.replace(token, str(conditional_escape(values.get(key, ''))))
+        return body
+
+    return personalise
+
+
+def queue_digest_notifications(recipients, subject, context, messages=None):
+    """Queue a notification for recipients who receive email digests.
+
+    messages optionally maps a recipient id to a personalised message line;
+    otherwise context['message'] is used.
+    """
+    messages = messages or {}
+    url = context.get('engagement_url') or context.get('profile_url') or ''
+    PendingNotification.objects.bulk_create([
+        PendingNotification(
+            recipient=recipient,
+            subject=subject[:200],
+            message=str(messages.get(recipient.id, context.get('message', '')))[:400],
+            engagement_name=str(context.get('engagement_name', context.get('Employee', '')))[:200],
+            url=url[:500],
+        )
+        for recipient in recipients
+    ])
+
+
+def split_digest_recipients(recipients):
+    """Split recipients into (immediate, digest) lists based on their email_digest preference."""
+    immediate, digest = [], []
+    for recipient in recipients:
+        (digest if recipient.email_digest else immediate).append(recipient)
+    return immediate, digest
+
+
+def send_fan_out_email(subject, template_name, context, recipients, recipient_fields):
+    """Send the same notification to many recipients with one render and one connection.
+
+    recipient_fields maps a context key to a callable that returns the value
+    for a given recipient, e.g. {'first_name': lambda emp: emp.first_name}.
+    Recipients who opted in to email digests get the notification queued for
+    their next digest instead.
+    """
+    recipients = [recipient for recipient in recipients if recipient.email]
+    recipients, digest_recipients = split_digest_recipients(recipients)
+    if digest_recipients:
+        messages = {}
+        if 'message' in recipient_fields:
+            messages = {r.id: recipient_fields['message'](r) for r in digest_recipients}
+        queue_digest_notifications(digest_recipients, subject, context, messages)
+    if not recipients:
+        return 0
+
+    personalise = render_fan_out_template(template_name, context, recipient_fields)
+    emails = []
+    for recipient in recipients:
+        values = {key: getter(recipient) for key, getter in recipient_fields.items()}
+        email = EmailMessage(subject, personalise(values), to=[recipient.email])
+        email.content_subtype = "html"
+        emails.append(email)
+
+    try:
+        connection = mail.get_connection()
+        with track_notification_send('notification'):
+            sent = connection.send_messages(emails)
+        NOTIFICATIONS_SENT.inc(sent, kind='notification')
+        return sent
+    except (SMTPException, OSError) as e:
+        logger.error("Failed to send emails: \n" + str(e))
+        return 0
+
+
+def send_due_digests(force=False):
+    """Send one digest email per user whose coalescing window has elapsed.
+
+    A window opens with the user's oldest pending notification and lasts
+    NOTIFICATION_DIGEST_WINDOW_MINUTES. With force=True every pending
+    notification is sent regardless of age. Returns the number of emails sent.
+    """
+    pending = PendingNotification.objects.all()
+    if not force:
+        cutoff = timezone.now() - datetime.timedelta(minutes=settings.NOTIFICATION_DIGEST_WINDOW_MINUTES)
+        due_recipients = pending.values('recipient').annotate(
+            first_created=Min('created_at')
+        ).filter(first_created__lte=cutoff).values('recipient')
+        pending = pending.filter(recipient__in=due_recipients)
+
+    recipients = Employee.objects.in_bulk(set(pending.values_list('recipient_id', flat=True)))
+
+    sent = 0
+    connection = mail.get_connection()
+    try:
+        for recipient_id, recipient in recipients.items():
+            # One transaction per recipient: their rows are deleted only once their digest is sent,
+            # a failure leaves everyone after them queued, and an overlapping run skips locked rows
+            with transaction.atomic():
+                events = list(PendingNotification.objects.filter(recipient_id=recipient_id)
+                              .select_for_update(skip_locked=True).order_by('created_at'))
+                if not events:
+                    continue
+                if recipient.email:
+                    context = {
+                        'first_name': recipient.first_name,
+                        'events': events,
+                        'protocol': 'https' if settings.USE_HTTPS else 'http',
+                        'domain': settings.DOMAIN,
+                    }
+                    email_body = loader.render_to_string(
+                        'CalendarinhoApp/emails/notification_digest_email.html', context)
+                    subject = f"Calendarinho: {len(events)} new notification{'s' if len(events) != 1 else ''}"
+                    email = EmailMessage(subject, email_body, to=[recipient.email])
+                    email.content_subtype = "html"
+                    with track_notification_send('digest'):
+                        sent += connection.send_messages([email])
+                    NOTIFICATIONS_SENT.inc(kind='digest')
+                PendingNotification.objects.filter(id__in=[event.id for event in events]).delete()
+    except (SMTPException, OSError) as e:
+        # Digests sent so far are committed, the rest stay queued for the next run
+        logger.error("Failed to send digest emails: \n" + str(e))
+    finally:
+        connection.close()
+    return sent
@@ -2,22 +2,30 @@ from threading import Thread
 from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import render
 from django.template import loader
-from .models import Employee, Engagement, Leave, ProjectManager
+from .models import DailyOccupancy, Employee, Engagement, Leave, ProjectManager
 from .forms import *
 from django.http import JsonResponse
 import datetime
+from bisect import bisect_right
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.core import mail
 from django.core.mail import EmailMessage
 import logging
 from django.conf import settings
+from django.core.paginator import Paginator
+from .email import send_fan_out_email
 from datetime import timedelta
 from .forms import LeaveForm
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
 
+# Engagements per page of the profile's history table
+PROFILE_HISTORY_PAGE_SIZE = 25
+
 @login_required
 def EmployeesTable(request):
     # Use optimized service function for better performance
@@ -83,27 +91,28 @@ def EmployeesTable(request):
 
 @login_required
 def profile(request, emp_id):
-    try:
-        emp = Employee.objects.get(id=emp_id)
-        upcoming = {}
-        upcoming["engagement"] = Engagement.objects.filter(employees=emp_id).filter(
-            start_date__gt=datetime.datetime.now().strftime("%Y-%m-%d")).order_by("start_date").first()
-        upcoming["vacation"] = Leave.objects.filter(employee_id=emp_id).filter(start_date__gt=datetime.datetime.now(
-        ).strftime("%Y-%m-%d")).filter(leave_type="Vacation").order_by("start_date").first()
-        upcoming["training"] = Leave.objects.filter(employee_id=emp_id).filter(start_date__gt=datetime.datetime.now(
-        ).strftime("%Y-%m-%d")).filter(leave_type="Training").order_by("start_date").first()
-        upcoming["work_from_home"] = Leave.objects.filter(employee_id=emp_id).filter(start_date__gt=datetime.datetime.now(
-        ).strftime("%Y-%m-%d")).filter(leave_type="Work from Home").order_by("start_date").first()
-        leaves = emp.getAllLeaves()
-        engagements = emp.getAllEngagements()
+    emp = Employee.objects.filter(id=emp_id).first()
+    if emp is None:
+        return not_found(request)
+    today = datetime.date.today()
+    upcoming = {"engagement": Engagement.objects.filter(employees=emp_id, start_date__gt=today).order_by("start_date").first()}
+    # The next leave of each type from one query over the future leaves
+    next_leaves = {}
+    for leave in Leave.objects.filter(employee_id=emp_id, start_date__gt=today).order_by("start_date", "id"):
+        next_leaves.setdefault(leave.leave_type, leave)
+    upcoming["vacation"] = next_leaves.get("Vacation")
+    upcoming["training"] = next_leaves.get("Training")
+    upcoming["work_from_home"] = next_leaves.get("Work from Home")
 
-        context = {"emp": emp,
-                   "lev": leaves,
-                   "engs": engagements,
-                   "upcoming": upcoming}
+    # The calendar loads its window from api_employee_events, the history table is paged
+    engagements = Paginator(
+        Engagement.objects.filter(employees=emp_id).select_related('client', 'service_type').order_by('-start_date', '-id'),
+        PROFILE_HISTORY_PAGE_SIZE,
+    ).get_page(request.GET.get('page'))
 
-    except Employee.DoesNotExist:
-        return not_found(request)
+    context = {"emp": emp,
+               "engs": engagements,
+               "upcoming": upcoming}
     return render(request, "CalendarinhoApp/profile.html", context)
 
 
@@ -111,26 +120,17 @@ def profile(request, emp_id):
 
 @login_required
 def EmployeesCal(request):
-    leaves = {}
-    engagements = Engagement.objects.none()
     selectedEmps = []
     if request.method == 'POST':
-        listemp = request.POST.getlist('emps')
-        for empID in listemp:
-            selectedEmps.append(Employee.objects.get(id=empID))
-        # Leaves
-        for empID in listemp:
-            emp = Employee.objects.get(id=empID)
-            leaves.update(
-                {emp.first_name+" "+emp.last_name: emp.getAllLeaves()})
-
-        # Engagements
-        for empID in listemp:
-            emp = Employee.objects.get(id=empID)
-            engagements = engagements | emp.engagements.all()
-        engagements = engagements.distinct()  # Remove Doublicate
+        listemp = [empID for empID in request.POST.getlist('emps') if empID.isdigit()]
+        selectedEmps = list(Employee.objects.filter(id__in=listemp).order_by('first_name', 'last_name'))
     emps = Employee.objects.exclude(is_active=False).order_by('first_name')
-    return render(request, 'CalendarinhoApp/EmployeesCalendar.html', {'employees': emps, 'leaves': leaves, 'engagements': engagements, 'selectedEmps': selectedEmps})
+    # Events of the selected employees are fetched per visible window from api_employee_events
+    return render(request, 'CalendarinhoApp/EmployeesCalendar.html', {
+        'employees': emps,
+        'selectedEmps': selectedEmps,
+        'selectedIDs': ','.join(str(emp.id) for emp in selectedEmps),
+    })
 
 
 def calculate_busy_days(employee, start_date, end_date):
@@ -210,16 +210,9 @@ def overlap(request):
 @login_required
 def overlapPrecentage(request):
     emps = Employee.objects.exclude(is_active=False)
-    count = 0
-    todayDate = datetime.date.today()
-
-    for emp in emps:
-        if (not emp.overlapCheck(todayDate, todayDate)):
-            count += 1
-        else:
-            pass
+    busy = DailyOccupancy.busy_on(datetime.date.today()).values('employee').distinct().count()
     try:
-        return "{:2.0f}%".format(100-(100*(count/emps.count())))
+        return "{:2.0f}%".format(100*(busy/emps.count()))
     except ZeroDivisionError:
         return "100%"
 
@@ -243,11 +236,8 @@ def LeaveCreate(request):
 
 @login_required
 def LeavesCal(request):
-    allEmps = Employee.objects.all()
-    leaves = {}
-    for emp in allEmps:
-        leaves.update({emp.first_name + " " + emp.last_name: emp.getAllLeaves()})
-    return render(request, 'CalendarinhoApp/LeavesCalendar.html', {'leaves':leaves})
+    # Events are fetched per visible window from api_leave_events
+    return render(request, 'CalendarinhoApp/LeavesCalendar.html')
 
 
 
@@ -255,43 +245,44 @@ def notifyManagersNewLeave(user, leave , request):
     """Send notifications to the managers after a new leave is added."""
     
     managers = Employee.getManagers()
-    emails = []
-    for manager in managers :
-        forEmployee = leave.emp.first_name + ' ' + leave.emp.last_name
-        addBy = user.first_name + ' ' + user.last_name
-        if leave.emp == user :
+    employee = leave.employee
+    addBy = user.first_name + ' ' + user.last_name
+
+    def leave_message(manager):
+        forEmployee = employee.first_name + ' ' + employee.last_name
+        addedBy = addBy
+        if employee == user :
               forEmployee = 'him or herself'
-        if leave.emp == manager:
+        if employee == manager:
               forEmployee = 'you'
         if user == manager:
-            addBy = 'you'
-        if user == manager == leave.emp:
-            addBy = 'you'
+            addedBy = 'you'
+        if user == manager == employee:
+            addedBy = 'you'
             forEmployee = 'yourself'
-        context = {
-                'first_name': manager.first_name,
-                'message': 'New leave added by ' + addBy
-                    + ' for ' + forEmployee,
-                'leave_type': leave.leave_type,
-                'start_date': leave.start_date,
-                'end_date': leave.end_date,
-                'note': leave.note,
-                'Employee': leave.emp.first_name + ' ' + leave.emp.last_name,
-                'profile_url': request.build_absolute_uri(reverse('CalendarinhoApp:profile',
-                    args=[leave.emp.id])),
-                'protocol': 'https' if settings.USE_HTTPS == True else 'http',
-                'domain' : settings.DOMAIN,
-            }
-        email_body = loader.render_to_string(
-            'CalendarinhoApp/emails/manager_new_leave_email.html', context)
-        email = EmailMessage('New leave added', email_body, to=[manager.email])
-        email.content_subtype = "html"
-        emails.append(email)
-    try:
-        connection = mail.get_connection()
-        connection.send_messages(emails)
-    except ConnectionRefusedError as e:
-        logger.error("Failed to send emails: \n" + str(e))
+        return 'New leave added by ' + addedBy + ' for ' + forEmployee
+
+    context = {
+            'leave_type': leave.leave_type,
+            'start_date': leave.start_date,
+            'end_date': leave.end_date,
+            'note': leave.note,
+            'Employee': employee.first_name + ' ' + employee.last_name,
+            'profile_url': request.build_absolute_uri(reverse('CalendarinhoApp:profile',
+                args=[employee.id])),
+            'protocol': 'https' if settings.USE_HTTPS == True else 'http',
+            'domain' : settings.DOMAIN,
+        }
+    send_fan_out_email(
+        'New leave added',
+        'CalendarinhoApp/emails/manager_new_leave_email.html',
+        context,
+        managers,
+        {
+            'first_name': lambda manager: manager.first_name,
+            'message': leave_message,
+        },
+    )
 
 
 def employeesUtilization(start_date, end_date):
@@ -301,22 +292,21 @@ def employeesUtilization(start_date, end_date):
 
     if not (isinstance(start_date, datetime.date) and isinstance(end_date, datetime.date)):
         raise Exception("Sorry, start date and end date should be date objects")
+    # Booked employees per day in one grouped query, headcount per day from the sorted join dates
+    busy = dict(DailyOccupancy.objects.filter(
+        date__range=(start_date, end_date), employee__is_active=True, employee__date_joined__date__lte=F('date'),
+    ).order_by().values('date').annotate(employees=Count('employee', distinct=True)).values_list('date', 'employees'))
+    joined = sorted(Employee.objects.filter(is_active=True, date_joined__date__lte=end_date)
+                    .annotate(joined=TruncDate('date_joined')).values_list('joined', flat=True))
     totalUtilization = 0
     numberOFDays = 0
     for single_date in daterange(start_date, end_date):
         numberOFDays += 1
-        dayUtilization = 0
-        employees_in_that_day = Employee.objects.filter(date_joined__lt = (single_date + timedelta(days=1)) ).exclude(is_active=False)
-        utilized_employees = []
-        for employee in employees_in_that_day:
-            if employee.overlapCheck(single_date,single_date):
-                utilized_employees.append(employee)
-        try:
-            dayUtilization = len(utilized_employees) / employees_in_that_day.count()
-        except ZeroDivisionError as e:
-            logger.error("Number of employees in " + str(single_date) + " is zero so utilization will be zero: \n" + str(e))
-            dayUtilization = 0
-        totalUtilization += dayUtilization
+        headcount = bisect_right(joined, single_date)
+        if headcount:
+            totalUtilization += busy.get(single_date, 0) / headcount
+        else:
+            logger.error("Number of employees in " + str(single_date) + " is zero so utilization will be zero")
     totalUtilization = totalUtilization / numberOFDays
     return totalUtilization
 
@@ -1,7 +1,8 @@
 from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import render, redirect
 from django.template import loader
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse
+from django.utils.http import content_disposition_header
 from .models import Employee, Engagement, Comment, Report, Vulnerability
 from .forms import *
 from django.urls import reverse
@@ -11,7 +12,9 @@ from django.core import mail
 from django.core.mail import EmailMessage
 from django.utils import timezone
 import logging
+from urllib.parse import quote
 from django.conf import settings
+from .email import send_fan_out_email, split_digest_recipients, queue_digest_notifications
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
@@ -171,11 +174,8 @@ def deleteMyComment(request, commentID):
 
 @login_required
 def EngagementsCal(request):
-    event_arr = Engagement.get_all_engagements()
-    context = {
-        "events": event_arr,
-    }
-    return render(request, 'CalendarinhoApp/EngagementsCalendar.html', context)
+    # Events are fetched per visible window from api_engagement_events
+    return render(request, 'CalendarinhoApp/EngagementsCalendar.html')
 
 
 @login_required
@@ -218,16 +218,90 @@ def uploadReport(request, eng_id):
             return render(request,'CalendarinhoApp/UploadReports.html',context)
 
 
+class _FileRange:
+    """Read-only view of length bytes of an open file starting at start, used for 206 responses."""
+
+    def __init__(self, fileobj, start, length):
+        fileobj.seek(start)
+        self.fileobj = fileobj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range_header(range_header, size):
+    """Parse a single "bytes=" range into an inclusive (start, end) tuple.
+
+    Returns None when the header is absent or not a single byte range (the
+    whole file is served), and raises ValueError when it cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    first, _, last = range_header[len('bytes='):].strip().partition('-')
+    try:
+        if first == '':
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            start, end = max(0, size - suffix), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError("Malformed range")
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
 @login_required
 def downloadReport(request, refUUID=None):
-    report = Report.objects.get(reference=refUUID)
-    if(report != None): #Check if UUID is correct
-        response = HttpResponse(report.file, content_type='application/pgp-encrypted')
-        filename=report.file.name
-        response['Content-Disposition'] = 'attachment; filename=%s' % (filename) #Filename
+    report = Report.objects.filter(reference=refUUID).first()
+    if report is None: #Check if UUID is correct
+        return not_found(request)
+
+    filename = report.download_name
+    content_type = 'application/pgp-encrypted'
+
+    if settings.REPORT_DOWNLOAD_X_ACCEL:
+        # Django only authorizes; nginx streams the file (with range support) from its internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.REPORT_DOWNLOAD_X_ACCEL_LOCATION + quote(report.file.name)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
         return response
-    else:
+
+    try:
+        size = report.file.size
+        range_ = parse_range_header(request.headers.get('Range'), size)
+    except FileNotFoundError:
         return not_found(request)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fileobj = report.file.open('rb')
+    if range_ is None:
+        response = FileResponse(fileobj, as_attachment=True, filename=filename, content_type=content_type)
+    else:
+        start, end = range_
+        response = FileResponse(_FileRange(fileobj, start, end - start + 1), status=206,
+                                as_attachment=True, filename=filename, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
 
 
 @login_required
@@ -432,6 +506,22 @@ def notifyEngagedEmployees(empsBefore, empsAfter, engagement, request):
     # Check the users removed from the engagement
     removedEmps = Employee.objects.filter(id__in=empsBefore - empsAfter)
 
+    # Users who opted in to digests get the change in their next digest email
+    engagement_url = request.build_absolute_uri(reverse('CalendarinhoApp:engagement', args=[engagement.id]))
+    addedEmps, addedDigest = split_digest_recipients(addedEmps)
+    removedEmps, removedDigest = split_digest_recipients(removedEmps)
+    if addedDigest:
+        queue_digest_notifications(addedDigest, 'You have been engaged', {
+            'message': str(request.user) + ' has assigned you to a new engagement',
+            'engagement_url': engagement_url,
+            'engagement_name': engagement.name,
+        })
+    if removedDigest:
+        queue_digest_notifications(removedDigest, 'You have been unengaged', {
+            'message': str(request.user) + ' has removed you from an engagement',
+            'engagement_url': engagement_url,
+            'engagement_name': engagement.name,
+        })
     
     #Send email to the added users
     try:
@@ -475,39 +565,9 @@ def notifyEngagedEmployees(empsBefore, empsAfter, engagement, request):
         logger.error("Failed to send emails: \n" + str(e))
 
 def notifyNewComment(comment, request):
-    user = comment.user
-    engagement = comment.engagement
-    employees = engagement.employees.exclude(id=user.id)
-    context = {
-        'message': f'New comment on your engagement by {user.get_full_name()}.',
-        'engagement_url': request.build_absolute_uri(reverse('CalendarinhoApp:engagement', args=[engagement.id])),
-        'engagement_name': engagement.name,
-        'user': user,
-        'commentbody': comment.body,
-        'protocol': 'https' if settings.USE_HTTPS else 'http',
-        'domain': settings.DOMAIN,
-    }
-    try:
-        with mail.get_connection() as connection:
-            for employee in employees :
-                context = {
-                        'first_name': employee.first_name,
-                        'message': 'New comment on your engagement by ' + user.first_name + ' ' + user.last_name + '.',
-                        'engagement_url': request.build_absolute_uri(reverse('CalendarinhoApp:engagement',
-                            args=[engagement.id])),
-                        'engagement_name': engagement.name,
-                        'user':user,
-                        'commentbody':comment.body,
-                        'protocol': 'https' if settings.USE_HTTPS == True else 'http',
-                        'domain' : settings.DOMAIN,
-                    }
-                email_body = loader.render_to_string(
-                    'CalendarinhoApp/emails/engagement_comment_email.html', context)
-                email = EmailMessage('New comment on your engagement', email_body, to=[employee.email], connection=connection)
-                email.content_subtype = "html"
-                email.send()
-    except ConnectionRefusedError as e:
-        logger.error("Failed to send emails: \n" + str(e))
+    """Send a new comment notification to everyone on the engagement except the author."""
+    employees = comment.engagement.employees.exclude(id=comment.user.id)
+    notifyRegularCommentUsers(comment, employees, request)
 
 
 def notifyNewReportUpload(report, request):
@@ -520,30 +580,19 @@ def notifyNewReportUpload(report, request):
         'message': f'New report uploaded on your engagement by {uploader.get_full_name()}.',
         'engagement_url': request.build_absolute_uri(reverse('CalendarinhoApp:engagement', args=[engagement.id])),
         'engagement_name': engagement.name,
-        'reportType': report.reportType,
+        'reportType': report.report_type,
         'user': uploader,
         'protocol': 'https' if settings.USE_HTTPS else 'http',
         'domain': settings.DOMAIN,
     }
 
-    try:
-        with mail.get_connection() as connection:
-            for employee in employees:
-                email_body = loader.render_to_string(
-                    'CalendarinhoApp/emails/engagement_comment_uploadReport.html', 
-                    {**context, 'recipient_first_name': employee.first_name}
-                )
-                email = EmailMessage(
-                    'New report uploaded on your engagement',
-                    email_body,
-                    to=[employee.email],
-                    connection=connection
-                )
-                email.content_subtype = "html"
-                email.send()
-            
-    except ConnectionRefusedError as e:
-        logger.error(f"Failed to send emails: {e}")
+    send_fan_out_email(
+        'New report uploaded on your engagement',
+        'CalendarinhoApp/emails/engagement_comment_uploadReport.html',
+        context,
+        employees,
+        {'recipient_first_name': lambda employee: employee.first_name},
+    )
 
 def notifyManagersNewEngagement(user, engagement, request):
     """Send notifications to the managers after a new engagement is added."""
@@ -559,28 +608,13 @@ def notifyManagersNewEngagement(user, engagement, request):
         'domain': settings.DOMAIN,
     }
 
-    try:
-        with mail.get_connection() as connection:
-            for manager in managers:
-                context = {**base_context, 'first_name': manager.first_name}
-                
-                email_body = loader.render_to_string(
-                    'CalendarinhoApp/emails/manager_new_engagement_email.html', 
-                    context
-                )
-                
-                email = EmailMessage(
-                    'New engagement added',
-                    email_body,
-                    to=[manager.email],
-                    connection=connection
-                )
-                email.content_subtype = "html"
-                
-                email.send()  # Send each email individually
-
-    except ConnectionRefusedError as e:
-        logger.error(f"Failed to send emails: {e}")
+    send_fan_out_email(
+        'New engagement added',
+        'CalendarinhoApp/emails/manager_new_engagement_email.html',
+        base_context,
+        managers,
+        {'first_name': lambda manager: manager.first_name},
+    )
 
 
 import re
@@ -758,35 +792,20 @@ def notifyMentionedUsers(comment, mentioned_users, everyone_mentioned, request):
         'domain': settings.DOMAIN,
     }
     
-    try:
-        with mail.get_connection() as connection:
-            for mentioned_user in users_to_notify:
-                user_context = {
-                    **context,
-                    'first_name': mentioned_user.first_name,
-                    'mentioned_user': mentioned_user,
-                }
-                
-                email_body = loader.render_to_string(
-                    'CalendarinhoApp/emails/mention_notification_email.html', 
-                    user_context
-                )
-                
-                subject = f'You were mentioned in a comment on {engagement.name}'
-                if everyone_mentioned:
-                    subject = f'Everyone was mentioned in a comment on {engagement.name}'
-                
-                email = EmailMessage(
-                    subject,
-                    email_body,
-                    to=[mentioned_user.email],
-                    connection=connection
-                )
-                email.content_subtype = "html"
-                email.send()
-                
-    except ConnectionRefusedError as e:
-        logger.error(f"Failed to send mention notification emails: {e}")
+    subject = f'You were mentioned in a comment on {engagement.name}'
+    if everyone_mentioned:
+        subject = f'Everyone was mentioned in a comment on {engagement.name}'
+    
+    send_fan_out_email(
+        subject,
+        'CalendarinhoApp/emails/mention_notification_email.html',
+        context,
+        users_to_notify,
+        {
+            'first_name': lambda mentioned_user: mentioned_user.first_name,
+            'mentioned_user': str,
+        },
+    )
 
 
 def notifyRegularCommentUsers(comment, users_to_notify, request):
@@ -806,27 +825,10 @@ def notifyRegularCommentUsers(comment, users_to_notify, request):
         'domain': settings.DOMAIN,
     }
     
-    try:
-        with mail.get_connection() as connection:
-            for employee in users_to_notify:
-                user_context = {
-                    **context,
-                    'first_name': employee.first_name,
-                }
-                
-                email_body = loader.render_to_string(
-                    'CalendarinhoApp/emails/engagement_comment_email.html', 
-                    user_context
-                )
-                
-                email = EmailMessage(
-                    'New comment on your engagement', 
-                    email_body, 
-                    to=[employee.email], 
-                    connection=connection
-                )
-                email.content_subtype = "html"
-                email.send()
-                
-    except ConnectionRefusedError as e:
-        logger.error(f"Failed to send regular comment emails: {e}")
+    send_fan_out_email(
+        'New comment on your engagement',
+        'CalendarinhoApp/emails/engagement_comment_email.html',
+        context,
+        users_to_notify,
+        {'first_name': lambda employee: employee.first_name},
+    )
@@ -0,0 +1,104 @@
+"""
+Weekly capacity vs demand forecast
+Capacity is the working days of active employees minus their leave, demand is the
+working days of booked engagements times the people on them. Both are counted per
+week for every engagement and leave at once with numpy business-day arithmetic
+"""
+
+import datetime
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .models import Engagement, Leave
+from .business_days import busday_count
+from users.models import CustomUser as Employee
+
+FORECAST_MIN_WEEKS = 26
+FORECAST_MAX_WEEKS = 52
+# Leave types that take a consultant off client work, working from home does not
+CAPACITY_LEAVE_TYPES = ('Training', 'Vacation')
+
+
+def weekly_busdays(starts, ends, week_starts):
+    """Working days each inclusive (start, end) range has in each week, as an n x weeks array"""
+    if not len(starts):
+        return np.zeros((0, len(week_starts)), dtype=np.int64)
+    first = np.maximum(np.array(starts, dtype='datetime64[D]')[:, None], week_starts[None, :])
+    last = np.minimum(np.array(ends, dtype='datetime64[D]')[:, None], week_starts[None, :] + 6)
+    return busday_count(first, last)
+
+
+def capacity_forecast(weeks=FORECAST_MIN_WEEKS, today=None):
+    """Capacity and demand in consultant-days for each of the next weeks, starting this (ISO) week
+
+    Engagements nobody is assigned to yet still count one consultant. Weeks
+    where demand exceeds capacity are flagged over_capacity.
+    """
+    today = today or timezone.now().date()
+    first_week = np.datetime64(today - datetime.timedelta(days=today.weekday()), 'D')
+    week_starts = first_week + 7 * np.arange(weeks)
+    horizon_start = first_week.astype(datetime.date)
+    horizon_end = (week_starts[-1] + 6).astype(datetime.date)
+
+    headcount = Employee.objects.filter(is_active=True).count()
+    working_days = busday_count(week_starts, week_starts + 6)
+
+    engagements = list(Engagement.objects.order_by().filter(
+        start_date__lte=horizon_end, end_date__gte=horizon_start,
+    ).annotate(people=Count('employees')).values_list('start_date', 'end_date', 'people'))
+    people = np.array([max(row[2], 1) for row in engagements], dtype=np.int64)
+    demand = (weekly_busdays([row[0] for row in engagements], [row[1] for row in engagements], week_starts)
+              * people[:, None]).sum(axis=0)
+
+    leaves = list(Leave.objects.order_by().filter(
+        employee__is_active=True, leave_type__in=CAPACITY_LEAVE_TYPES,
+        start_date__lte=horizon_end, end_date__gte=horizon_start,
+    ).values_list('start_date', 'end_date'))
+    leave_days = weekly_busdays([row[0] for row in leaves], [row[1] for row in leaves], week_starts).sum(axis=0)
+
+    capacity = np.maximum(headcount * working_days - leave_days, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(capacity > 0, np.round(demand / capacity * 100, 1), 0.0)
+
+    series = []
+    for week in range(weeks):
+        week_start = week_starts[week].astype(datetime.date)
+        series.append({
+            'week_start': week_start,
+            'week_end': week_start + datetime.timedelta(days=6),
+            'label': f"{week_start.isocalendar()[0]}-W{week_start.isocalendar()[1]:02d}",
+            'working_days': int(working_days[week]),
+            'capacity_days': int(capacity[week]),
+            'leave_days': int(leave_days[week]),
+            'demand_days': int(demand[week]),
+            'utilization': float(utilization[week]),
+            'shortfall_days': int(max(demand[week] - capacity[week], 0)),
+            'over_capacity': bool(demand[week] > capacity[week]),
+        })
+
+    over = [week for week in series if week['over_capacity']]
+    return {
+        'headcount': headcount,
+        'weeks': series,
+        'over_capacity_weeks': len(over),
+        'peak_shortfall_days': max((week['shortfall_days'] for week in over), default=0),
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_capacity_forecast(request):
+    """Weekly capacity vs demand for the next weeks (26 to 52, default 26)"""
+    if not (request.user.is_superuser or request.user.user_type == 'M'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        weeks = int(request.GET.get('weeks', FORECAST_MIN_WEEKS))
+    except ValueError:
+        weeks = FORECAST_MIN_WEEKS
+    weeks = max(FORECAST_MIN_WEEKS, min(weeks, FORECAST_MAX_WEEKS))
+    return JsonResponse({'success': True, 'data': capacity_forecast(weeks)})
@@ -0,0 +1,122 @@
+"""
+Team occupancy heatmap: consultants engaged, on leave and free on every day of a window
+Each employee's bookings are merged into disjoint intervals so people are counted once,
+then per-day counts come from numpy difference arrays and cumulative sums in
+O(intervals + days). Results are cached per filter combination
+"""
+
+import datetime
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .api_performance import generate_cache_key, get_cached_or_compute
+from .business_days import is_busday
+from .forecasting import CAPACITY_LEAVE_TYPES
+from .models import Engagement, Leave
+from users.models import CustomUser as Employee
+
+HEATMAP_CACHE_TTL = 300
+HEATMAP_MAX_DAYS = 366
+
+
+def merge_intervals(rows):
+    """Disjoint inclusive (start, end) intervals from (employee_id, start, end) rows, merged per employee"""
+    merged = []
+    current_employee = current_start = current_end = None
+    for employee_id, start, end in sorted(rows):
+        if employee_id == current_employee and start <= current_end + datetime.timedelta(days=1):
+            current_end = max(current_end, end)
+            continue
+        if current_employee is not None:
+            merged.append((current_start, current_end))
+        current_employee, current_start, current_end = employee_id, start, end
+    if current_employee is not None:
+        merged.append((current_start, current_end))
+    return merged
+
+
+def daily_counts(intervals, start_date, days):
+    """Number of intervals covering each day of the window, with a difference array"""
+    diff = np.zeros(days + 1, dtype=np.int64)
+    if intervals:
+        origin = np.datetime64(start_date, 'D')
+        starts = np.array([interval[0] for interval in intervals], dtype='datetime64[D]')
+        ends = np.array([interval[1] for interval in intervals], dtype='datetime64[D]')
+        np.add.at(diff, np.clip((starts - origin).astype(np.int64), 0, days), 1)
+        np.add.at(diff, np.clip((ends - origin).astype(np.int64) + 1, 0, days), -1)
+    return np.cumsum(diff[:-1])
+
+
+def occupancy_heatmap(start_date, end_date, service_type_id=None, user_type=None):
+    """Per-day counts of active employees (optionally of one user type) between the dates
+
+    engaged counts people on an engagement (of service_type_id when given),
+    on_leave people on training or vacation and free people with neither,
+    whatever the service type. working flags the working days.
+    """
+    days = (end_date - start_date).days + 1
+    # One filter() call, so the employee conditions and values share the employees join
+    people = {'is_active': True, **({'user_type': user_type} if user_type else {})}
+
+    headcount = Employee.objects.filter(**people).count()
+    assignments = list(Engagement.objects.order_by().filter(
+        start_date__lte=end_date, end_date__gte=start_date,
+        **{f'employees__{field}': value for field, value in people.items()},
+    ).values_list('employees', 'start_date', 'end_date', 'service_type_id'))
+    leaves = list(Leave.objects.order_by().filter(
+        leave_type__in=CAPACITY_LEAVE_TYPES, start_date__lte=end_date, end_date__gte=start_date,
+        **{f'employee__{field}': value for field, value in people.items()},
+    ).values_list('employee_id', 'start_date', 'end_date'))
+    engaged_rows = [row[:3] for row in assignments if service_type_id is None or row[3] == service_type_id]
+
+    engaged = daily_counts(merge_intervals(engaged_rows), start_date, days)
+    on_leave = daily_counts(merge_intervals(leaves), start_date, days)
+    busy = daily_counts(merge_intervals([row[:3] for row in assignments] + leaves), start_date, days)
+    working = is_busday(np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1))
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': days,
+        'headcount': headcount,
+        'engaged': engaged.tolist(),
+        'on_leave': on_leave.tolist(),
+        'free': np.maximum(headcount - busy, 0).tolist(),
+        'working': working.astype(np.int8).tolist(),
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_occupancy_heatmap(request):
+    """Daily engaged/on leave/free counts for ?year (default this year) or ?start_date and ?end_date,
+    optionally filtered by ?service_type (id) and ?user_type (E or M)"""
+    if not (request.user.is_superuser or request.user.user_type == 'M'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        if request.GET.get('start_date') or request.GET.get('end_date'):
+            start_date = datetime.date.fromisoformat(request.GET.get('start_date', ''))
+            end_date = datetime.date.fromisoformat(request.GET.get('end_date', ''))
+        else:
+            year = int(request.GET.get('year', timezone.now().year))
+            start_date, end_date = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+        service_type_id = int(request.GET['service_type']) if request.GET.get('service_type') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid year, dates or service_type'}, status=400)
+    user_type = request.GET.get('user_type') or None
+    if user_type not in (None, *dict(Employee.USER_TYPE_CHOICES)):
+        return JsonResponse({'success': False, 'error': 'Invalid user_type'}, status=400)
+    if end_date < start_date or (end_date - start_date).days >= HEATMAP_MAX_DAYS:
+        return JsonResponse({'success': False, 'error': f'The window must be 1 to {HEATMAP_MAX_DAYS} days'},
+                            status=400)
+
+    cache_key = generate_cache_key('occupancy_heatmap', start_date=start_date, end_date=end_date,
+                                   service_type=service_type_id, user_type=user_type)
+    data = get_cached_or_compute(
+        cache_key, lambda: occupancy_heatmap(start_date, end_date, service_type_id, user_type), HEATMAP_CACHE_TTL)
+    return JsonResponse({'success': True, 'data': data})
@@ -0,0 +1,224 @@
+"""
+iCalendar (ICS) subscription feeds for calendar clients such as Outlook and Google
+Feeds cover one employee, one client or the whole team and are addressed by a signed
+token, since calendar clients cannot log in. Each feed has a version row (shared by all
+workers) that the signals in signals.py renew when its engagements or leaves change, plus
+one for all feeds renewed when a client, service or employee is renamed. The versions are
+read with the token's user in one query per request, never written by a poll: they make
+the ETag (unchanged polls get a 304) and key the cached body, which is streamed from the
+database on the first request after a change
+"""
+
+import datetime
+import hashlib
+import time
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Subquery
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+
+from .models import CalendarFeedVersion, Client, Engagement, Leave
+from users.models import CustomUser as Employee
+
+ICS_FEED_SALT = 'CalendarinhoApp.ics_feeds'
+ICS_FEED_KINDS = ('employee', 'client', 'team')
+# Seconds a generated feed body stays cached, bodies are keyed by the feed version so a
+# worker's cache never serves one from before a change
+ICS_FEED_CACHE_TIMEOUT = 24 * 60 * 60
+# Seconds calendar clients may reuse a feed before polling again
+ICS_FEED_MAX_AGE = 5 * 60
+# Engagements and leaves that ended longer ago are left out of the feeds
+ICS_FEED_PAST_DAYS = 180
+ICS_ITERATOR_CHUNK_SIZE = 500
+
+
+def feed_token(user, kind, object_id=None):
+    """Signed token for a feed, valid while the user who created it is active"""
+    return signing.dumps([user.id, kind, object_id], salt=ICS_FEED_SALT, compress=True)
+
+
+def feed_url(request, kind, object_id=None):
+    """Absolute subscription URL of a feed for the requesting user"""
+    return request.build_absolute_uri(
+        reverse('CalendarinhoApp:ics_feed', args=[feed_token(request.user, kind, object_id)]))
+
+
+def parse_feed_token(token):
+    """(kind, object_id, version) of a valid token, or None, in one query"""
+    try:
+        user_id, kind, object_id = signing.loads(token, salt=ICS_FEED_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if kind not in ICS_FEED_KINDS:
+        return None
+    versions = Employee.objects.filter(id=user_id, is_active=True).annotate(
+        all_version=feed_version_subquery('all'),
+        feed_version=feed_version_subquery(kind, object_id),
+    ).values_list('all_version', 'feed_version').first()
+    if versions is None:
+        return None
+    return kind, object_id, '-'.join(str(version or 0) for version in versions)
+
+
+def feed_version_subquery(kind, object_id=None):
+    return Subquery(CalendarFeedVersion.objects.filter(kind=kind, object_id=object_id or 0).values('version')[:1])
+
+
+def request_feed(request, token):
+    """parse_feed_token, once per request (the ETag and the view both need it)"""
+    if not hasattr(request, '_ics_feed'):
+        request._ics_feed = parse_feed_token(token)
+    return request._ics_feed
+
+
+def renew_versions(feeds):
+    """Start new versions of the (kind, object_id) feeds, creating their rows if need be"""
+    version = time.time_ns()
+    CalendarFeedVersion.objects.bulk_create(
+        [CalendarFeedVersion(kind=kind, object_id=object_id, version=version) for kind, object_id in feeds],
+        update_conflicts=True, unique_fields=['kind', 'object_id'], update_fields=['version'])
+
+
+def invalidate_feeds(employee_ids=(), client_ids=()):
+    """Start new versions of the team feed and the feeds of the employees and clients"""
+    renew_versions([('team', 0)]
+                   + [('employee', employee_id) for employee_id in set(employee_ids) if employee_id]
+                   + [('client', client_id) for client_id in set(client_ids) if client_id])
+
+
+def invalidate_all_feeds():
+    """Start a new version of every feed, for changes to names that many feeds show"""
+    renew_versions([('all', 0)])
+
+
+def escape_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], ''
+    for char in line:
+        limit = 75 if not parts else 74
+        if len((current + char).encode()) > limit:
+            parts.append(current)
+            current = ''
+        current += char
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def vevent(uid, stamp, start_date, end_date, summary, description='', url=''):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART;VALUE=DATE:{start_date:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{end_date + datetime.timedelta(days=1):%Y%m%d}',
+        f'SUMMARY:{escape_text(summary)}',
+    ]
+    if description:
+        lines.append(f'DESCRIPTION:{escape_text(description)}')
+    if url:
+        lines.append(f'URL:{url}')
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def feed_events(request, kind, object_id):
+    """Engagements and leaves of a feed, read in chunks so large feeds are never held in memory"""
+    since = timezone.now().date() - datetime.timedelta(days=ICS_FEED_PAST_DAYS)
+    engagements = Engagement.objects.filter(end_date__gte=since)
+    leaves = Leave.objects.filter(end_date__gte=since)
+    if kind == 'employee':
+        engagements = engagements.filter(employees=object_id)
+        leaves = leaves.filter(employee_id=object_id)
+    elif kind == 'client':
+        engagements = engagements.filter(client_id=object_id)
+        leaves = Leave.objects.none()
+
+    host = request.get_host().split(':')[0]
+    stamp = timezone.now().astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    for eng in engagements.select_related('client', 'service_type').prefetch_related('employees').order_by(
+            'start_date', 'id').iterator(chunk_size=ICS_ITERATOR_CHUNK_SIZE):
+        employees = ', '.join(f"{emp.first_name} {emp.last_name}" for emp in eng.employees.all())
+        yield vevent(
+            f'engagement-{eng.id}@{host}', stamp, eng.start_date, eng.end_date,
+            f"{eng.name} -- {eng.service_type}",
+            f"Client: {eng.client}\nEmployees: {employees}",
+            request.build_absolute_uri(reverse('CalendarinhoApp:engagement', args=[eng.id])),
+        )
+    for leave in leaves.select_related('employee').order_by('start_date', 'id').iterator(
+            chunk_size=ICS_ITERATOR_CHUNK_SIZE):
+        yield vevent(
+            f'leave-{leave.id}@{host}', stamp, leave.start_date, leave.end_date,
+            f"{leave.employee.first_name} {leave.employee.last_name} - {leave.leave_type}",
+            leave.note,
+        )
+
+
+def write_calendar(name, events):
+    yield (f'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Calendarinho//Calendarinho//EN\r\n'
+           f'CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n{fold("X-WR-CALNAME:" + escape_text(name))}').encode()
+    for event in events:
+        yield event.encode()
+    yield b'END:VCALENDAR\r\n'
+
+
+def cache_stream(chunks, key):
+    """Pass the chunks through and cache the whole body once it has been sent"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(body), ICS_FEED_CACHE_TIMEOUT)
+
+
+def feed_etag(request, token):
+    feed = request_feed(request, token)
+    if feed is None:
+        return None
+    return hashlib.md5(':'.join(map(str, feed)).encode()).hexdigest()
+
+
+@require_http_methods(["GET", "HEAD"])
+@cache_control(private=True, max_age=ICS_FEED_MAX_AGE)
+@condition(etag_func=feed_etag)
+def ics_feed(request, token):
+    """Subscription feed of a token, answers 304 while the feed has not changed"""
+    feed = request_feed(request, token)
+    if feed is None:
+        raise Http404("Unknown calendar feed")
+    kind, object_id, version = feed
+    if kind == 'employee':
+        employee = Employee.objects.filter(id=object_id).first()
+        if employee is None:
+            raise Http404("Unknown calendar feed")
+        name = f"{employee.first_name} {employee.last_name} - Calendarinho"
+    elif kind == 'client':
+        client = Client.objects.filter(id=object_id).first()
+        if client is None:
+            raise Http404("Unknown calendar feed")
+        name = f"{client.name} - Calendarinho"
+    else:
+        name = "Calendarinho Team"
+
+    key = f"ics:body:{kind}:{object_id or ''}:{version}"
+    body = cache.get(key)
+    content_type = 'text/calendar; charset=utf-8'
+    if body is not None:
+        response = HttpResponse(body, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(cache_stream(write_calendar(name, feed_events(request, kind, object_id)), key),
+                                         content_type=content_type)
+    response['Content-Disposition'] = 'inline; filename="calendarinho.ics"'
+    return response
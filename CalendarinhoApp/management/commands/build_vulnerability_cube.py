@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from CalendarinhoApp.models import VulnerabilityCube
+
+
+class Command(BaseCommand):
+    help = ('Refresh the vulnerability cube; without --full only months changed since the last build '
+            'are recomputed (run it during the day, and with --full nightly)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every month, e.g. from a nightly cron job',
+        )
+
+    def handle(self, *args, **options):
+        cells = VulnerabilityCube.rebuild(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Rebuilt' if options['full'] else 'Refreshed'} vulnerability cube: {cells} cell(s) written"
+        ))
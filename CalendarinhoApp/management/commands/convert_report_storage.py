@@ -0,0 +1,74 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from CalendarinhoApp.models import Report
+from CalendarinhoApp.storage import report_storage
+
+
+class Command(BaseCommand):
+    help = ('Move report files from the flat Reports/ layout into content-addressed storage '
+            'and delete blobs no report references any more')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be converted or pruned',
+        )
+        parser.add_argument(
+            '--no-prune',
+            action='store_true',
+            help='Do not delete unreferenced blobs (e.g. left behind by engagement deletes before they cleaned up)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        converted = missing = 0
+
+        for report in Report.objects.exclude(file='').iterator():
+            old_name = report.file.name
+            if report_storage.is_blob_name(old_name):
+                continue
+            if not report_storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f"Missing file for report {report.reference}: {old_name}")
+                continue
+
+            converted += 1
+            if dry_run:
+                continue
+            with report_storage.blob_lock():
+                with report_storage.open(old_name, 'rb') as old_file:
+                    new_name = report_storage.save(Report.set_filename(report, old_name), old_file)
+                Report.objects.filter(pk=report.pk).update(file=new_name)
+            if not Report.objects.filter(file=old_name).exists():
+                report_storage.delete(old_name)
+
+        pruned = 0 if options['no_prune'] else self.prune(dry_run)
+        blobs = Report.objects.exclude(file='').values('file').distinct().count()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would convert' if dry_run else 'Converted'} {converted} report(s), "
+            f"{'would prune' if dry_run else 'pruned'} {pruned} unreferenced blob(s), "
+            f"{missing} missing file(s); {Report.objects.count()} report(s) share {blobs} stored file(s)"
+        ))
+
+    def prune(self, dry_run):
+        """Delete sharded blobs under Reports/ that no Report row points at"""
+        root = report_storage.path('Reports')
+        if not os.path.isdir(root):
+            return 0
+
+        referenced = set(Report.objects.exclude(file='').values_list('file', flat=True))
+        pruned = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), report_storage.location).replace(os.sep, '/')
+                if not report_storage.is_blob_name(name) or name in referenced:
+                    continue
+                pruned += 1
+                if not dry_run:
+                    # Checks the references again, a report may have been uploaded meanwhile
+                    Report.delete_unreferenced_file(name)
+        return pruned
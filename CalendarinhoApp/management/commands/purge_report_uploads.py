@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from CalendarinhoApp.api_uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Discard chunked report uploads left unfinished for longer than REPORT_UPLOAD_TTL_HOURS'
+
+    def handle(self, *args, **options):
+        purged = purge_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f"Discarded {purged} stale upload(s) (TTL: {settings.REPORT_UPLOAD_TTL_HOURS} hours)"
+        ))
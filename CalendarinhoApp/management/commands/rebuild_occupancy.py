@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from CalendarinhoApp.models import DailyOccupancy, Engagement, Leave
+from users.models import CustomUser as Employee
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily occupancy table of every employee from the engagements and leaves'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of employees rebuilt per transaction',
+        )
+
+    def handle(self, *args, **options):
+        spans = [
+            Engagement.objects.aggregate(start=Min('start_date'), end=Max('end_date')),
+            Leave.objects.aggregate(start=Min('start_date'), end=Max('end_date')),
+        ]
+        starts = [span['start'] for span in spans if span['start']]
+        ends = [span['end'] for span in spans if span['end']]
+        if not starts:
+            deleted, _ = DailyOccupancy.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"No engagements or leaves, removed {deleted} row(s)"))
+            return
+        start_date, end_date = min(starts), max(ends)
+
+        # Rows outside every engagement and leave can only be left over from raw changes
+        DailyOccupancy.objects.exclude(date__range=(start_date, end_date)).delete()
+        employee_ids = list(Employee.objects.order_by('id').values_list('id', flat=True))
+        batch_size = max(options['batch_size'], 1)
+        for index in range(0, len(employee_ids), batch_size):
+            DailyOccupancy.refresh(employee_ids[index:index + batch_size], start_date, end_date)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt occupancy of {len(employee_ids)} employee(s) from {start_date} to {end_date}: "
+            f"{DailyOccupancy.objects.count()} row(s)"
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from CalendarinhoApp.models import Client, Engagement, VulnerabilityRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the vulnerability rollup counters of every engagement and client from the vulnerability table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report rollups that differ from the vulnerability table',
+        )
+
+    def handle(self, *args, **options):
+        stale = 0
+        with transaction.atomic():
+            existing = {
+                (rollup.engagement_id, rollup.client_id): rollup.as_summary()
+                for rollup in VulnerabilityRollup.objects.all()
+            }
+            if options['check']:
+                # Roll back the rebuild below, it is only used for the comparison
+                sid = transaction.savepoint()
+
+            rebuilt = {}
+            for engagement_id in Engagement.objects.values_list('id', flat=True):
+                rollup = VulnerabilityRollup.refresh_engagement(engagement_id)
+                rebuilt[(engagement_id, None)] = rollup.as_summary()
+            for client_id in Client.objects.values_list('id', flat=True):
+                rollup = VulnerabilityRollup.refresh_client(client_id)
+                rebuilt[(None, client_id)] = rollup.as_summary()
+
+            for key, summary in rebuilt.items():
+                if existing.get(key) != summary:
+                    stale += 1
+                    engagement_id, client_id = key
+                    owner = f"engagement {engagement_id}" if engagement_id else f"client {client_id}"
+                    self.stdout.write(f"{'Stale' if options['check'] else 'Fixed'} rollup for {owner}")
+
+            if options['check']:
+                transaction.savepoint_rollback(sid)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {len(rebuilt)} rollup(s), {stale} {'stale' if options['check'] else 'reconciled'}"
+        ))
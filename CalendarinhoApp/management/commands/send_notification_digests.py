@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from CalendarinhoApp.email import send_due_digests
+
+
+class Command(BaseCommand):
+    help = 'Send coalesced notification digest emails to users who opted in to digests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Send every pending notification now, ignoring the coalescing window',
+        )
+
+    def handle(self, *args, **options):
+        sent = send_due_digests(force=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sent} digest email(s) "
+            f"(window: {settings.NOTIFICATION_DIGEST_WINDOW_MINUTES} minutes)"
+        ))
@@ -0,0 +1,305 @@
+"""
+Prometheus metrics: counters, fixed-bucket histograms and gauges, served at /metrics
+Each process adds to its counters and histograms in memory and folds them into the shared
+METRICS_FILE at most every METRICS_FLUSH_INTERVAL seconds (and on exit), under an
+exclusive file lock, so every gunicorn worker and management command adds to the same
+totals. Gauges are read from the database when the endpoint is scraped
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_http_methods
+
+from .models import PendingNotification, ReportUpload
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the development server runs a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+# Increments since the last flush, by (metric name, sorted label pairs)
+_pending = {}
+_last_flush = time.monotonic()
+_registry = {}
+
+
+def series_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, not {tuple(labels)}")
+        return self.name, series_key(labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            _pending[key] = _pending.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Counts of observations at or below each upper bound, plus their sum"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            # Per-bucket (not cumulative) counts, an overflow bucket, then the sum
+            counts = _pending.setdefault(key, [0] * (len(self.buckets) + 2))
+            counts[next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Gauge(Metric):
+    """Value read on scrape: collect() returns a number or (labels dict, number) pairs"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        value = self.collect()
+        if isinstance(value, (int, float)):
+            return [((), value)]
+        return [(series_key(labels), sample) for labels, sample in value]
+
+
+def add(totals, key, value):
+    """Add a counter value or histogram counts to totals[key]"""
+    current = totals.get(key)
+    if current is None:
+        totals[key] = value
+    elif isinstance(value, list):
+        totals[key] = [a + b for a, b in zip(current, value)]
+    else:
+        totals[key] = current + value
+
+
+def read_totals():
+    try:
+        with open(settings.METRICS_FILE) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return {}
+
+
+@contextmanager
+def file_lock():
+    os.makedirs(os.path.dirname(settings.METRICS_FILE), exist_ok=True)
+    with open(settings.METRICS_FILE + '.lock', 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def flush():
+    """Fold this process's increments into METRICS_FILE"""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    try:
+        with file_lock():
+            totals = read_totals()
+            for (name, labels), value in pending.items():
+                add(totals, json.dumps([name, labels]), value)
+            temp_name = f"{settings.METRICS_FILE}.{os.getpid()}.tmp"
+            with open(temp_name, 'w') as temp_file:
+                json.dump(totals, temp_file)
+            os.replace(temp_name, settings.METRICS_FILE)
+    except OSError as e:
+        logger.error("Failed to write metrics: %s", e)
+        # Keep the increments for the next flush
+        with _lock:
+            for key, value in pending.items():
+                add(_pending, key, value)
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def forget_parent_increments():
+    # A forked worker must not flush its parent's increments a second time
+    global _pending, _lock
+    _pending, _lock = {}, threading.Lock()
+
+
+atexit.register(flush)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=forget_parent_increments)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(str(value))}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    series = {}
+    for key, value in read_totals().items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append((tuple(map(tuple, labels)), value))
+
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        if isinstance(metric, Gauge):
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error("Failed to collect %s: %s", name, e)
+                continue
+            lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+        elif isinstance(metric, Histogram):
+            for labels, counts in sorted(series.get(name, [])):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, le=format_value(bound))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(counts[-1])}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        else:
+            lines.extend(f"{name}{format_labels(labels)} {format_value(value)}"
+                         for labels, value in sorted(series.get(name, [])))
+    return '\n'.join(lines) + '\n'
+
+
+def pending_notifications():
+    return PendingNotification.objects.count()
+
+
+def oldest_pending_notification_age():
+    oldest = PendingNotification.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    return (timezone.now() - oldest).total_seconds() if oldest else 0
+
+
+def report_uploads_in_progress():
+    return ReportUpload.objects.count()
+
+
+HTTP_REQUESTS = Counter(
+    'calendarinho_http_requests_total', 'Requests by view, method and status code.',
+    ('view', 'method', 'status'))
+HTTP_REQUEST_DURATION = Histogram(
+    'calendarinho_http_request_duration_seconds', 'Request latency by view and method.', ('view', 'method'))
+CACHE_HITS = Counter('calendarinho_cache_hits_total', 'Cache lookups that found a value.', ('cache',))
+CACHE_MISSES = Counter('calendarinho_cache_misses_total', 'Cache lookups that found nothing.', ('cache',))
+CACHE_EVICTIONS = Counter('calendarinho_cache_evictions_total', 'Expired cache entries dropped.', ('cache',))
+NOTIFICATION_SEND_DURATION = Histogram(
+    'calendarinho_notification_send_duration_seconds', 'Time to hand notification emails to the mail server.',
+    ('kind',), buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+NOTIFICATIONS_SENT = Counter('calendarinho_notifications_sent_total', 'Notification emails sent.', ('kind',))
+NOTIFICATION_FAILURES = Counter(
+    'calendarinho_notification_failures_total', 'Notification sends that raised an error.', ('kind',))
+Gauge('calendarinho_notification_queue_depth', 'Notifications waiting for a digest email.',
+      pending_notifications)
+Gauge('calendarinho_notification_queue_oldest_seconds', 'Age of the oldest notification waiting for a digest.',
+      oldest_pending_notification_age)
+Gauge('calendarinho_report_uploads_in_progress', 'Chunked report uploads not finalized yet.',
+      report_uploads_in_progress)
+
+
+@contextmanager
+def track_notification_send(kind):
+    """Time a notification send and count it as a failure when it raises"""
+    try:
+        with NOTIFICATION_SEND_DURATION.time(kind=kind):
+            yield
+    except Exception:
+        NOTIFICATION_FAILURES.inc(kind=kind)
+        raise
+
+
+class MetricsMiddleware:
+    """Count requests and time them per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths share one label so random URLs cannot create series
+        view = match.view_name if match else 'unresolved'
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, view=view, method=request.method)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        maybe_flush()
+        return response
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus scrape endpoint, open to METRICS_ALLOWED_IPS or a Bearer METRICS_TOKEN"""
+    token = settings.METRICS_TOKEN
+    authorized = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or (
+        token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'))
+    if not authorized:
+        return HttpResponseForbidden()
+    flush()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -1,12 +1,15 @@
 from statistics import mode
 from typing import Tuple
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from django.db.models import Count, Q, Case, When, IntegerField
+from django.db.models import Count, Q, Case, When, IntegerField, Sum, Max, F, Value, ExpressionWrapper
+from django.db.models.functions import TruncMonth, TruncDate, Coalesce
 import datetime, uuid
 from collections import namedtuple
 from users.models import CustomUser as Employee
 from os.path import splitext
+from .storage import get_report_storage
+from .request_memo import request_memoized
 from django.core.exceptions import ValidationError
 
 
@@ -87,36 +90,10 @@ class Client(models.Model):
         
         return score
 
+    @request_memoized
     def get_vulnerability_summary(self):
-        """Get vulnerability summary for all client engagements using optimized database queries"""
-        # Use aggregation to count vulnerabilities in a single query
-        summary_data = self.engagements.aggregate(
-            critical_open=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Critical', vulnerabilities__status='Open')),
-            high_open=Count('vulnerabilities', filter=Q(vulnerabilities__severity='High', vulnerabilities__status='Open')),
-            medium_open=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Medium', vulnerabilities__status='Open')),
-            low_open=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Low', vulnerabilities__status='Open')),
-            critical_fixed=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Critical', vulnerabilities__status='Fixed')),
-            high_fixed=Count('vulnerabilities', filter=Q(vulnerabilities__severity='High', vulnerabilities__status='Fixed')),
-            medium_fixed=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Medium', vulnerabilities__status='Fixed')),
-            low_fixed=Count('vulnerabilities', filter=Q(vulnerabilities__severity='Low', vulnerabilities__status='Fixed')),
-        )
-        
-        # Calculate totals
-        summary_data['total_open'] = (
-            summary_data['critical_open'] + summary_data['high_open'] + 
-            summary_data['medium_open'] + summary_data['low_open']
-        )
-        summary_data['total_fixed'] = (
-            summary_data['critical_fixed'] + summary_data['high_fixed'] + 
-            summary_data['medium_fixed'] + summary_data['low_fixed']
-        )
-        
-        # Count engagements with open vulnerabilities
-        summary_data['engagements_with_vulnerabilities'] = self.engagements.filter(
-            vulnerabilities__status='Open'
-        ).distinct().count()
-        
-        return summary_data
+        """Get vulnerability summary for all client engagements from the client's rollup counters"""
+        return VulnerabilityRollup.for_client(self).as_summary()
 
 
 class Service(models.Model):
@@ -135,10 +112,29 @@ class Leave(models.Model):
     end_date = models.DateField('End Date')
     leave_type = models.CharField(max_length=20, choices=LEAVE_TYPES, default="Vacation", verbose_name="Leave Type")
 
+    CALENDAR_COLORS = {"Vacation": "#2C3E50", "Training": "#2980B9", "Work from Home": "#f39c12"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'end_date']),
+        ]
+
     def __str__(self):
         return f"{self.leave_type} - {self.note}"
 
 
+class Holiday(models.Model):
+    """A public holiday, not counted as a working day in utilization and availability"""
+    name = models.CharField(max_length=100)
+    date = models.DateField(unique=True)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.name} ({self.date})"
+
+
 class OTP(models.Model):
     code = models.CharField(max_length=6, default='999999')
     email = models.EmailField(max_length=50)
@@ -153,6 +149,25 @@ class OTP(models.Model):
         return delta.total_seconds()
 
     
+class PendingNotification(models.Model):
+    """A notification waiting to be delivered in the recipient's next digest email."""
+    recipient = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='pending_notifications')
+    subject = models.CharField(max_length=200)
+    message = models.CharField(max_length=400, blank=True)
+    engagement_name = models.CharField(max_length=200, blank=True)
+    url = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient}"
+
+
 class ProjectManager(models.Model):
     name = models.CharField(max_length=200, blank=True)
     phone = models.CharField(max_length=15, blank=True)
@@ -177,14 +192,21 @@ class Engagement(models.Model):
     project_manager = models.ForeignKey(
         ProjectManager, on_delete=models.PROTECT, related_name='engagements', verbose_name="Project Manager", null=True, blank=True)
 
+    CALENDAR_COLORS = [
+        "#990000", "#994C00", "#666600", "#336600", "#006600", "#006633",
+        "#006666", "#003366", "#000066", "#330066", "#660066", "#660033", "#202020"
+    ]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'end_date']),
+        ]
+
     @classmethod
     def get_all_engagements(cls):
         event_arr = []
         all_events = cls.objects.all()
-        colors = [
-            "#990000", "#994C00", "#666600", "#336600", "#006600", "#006633",
-            "#006666", "#003366", "#000066", "#330066", "#660066", "#660033", "#202020"
-        ]
+        colors = cls.CALENDAR_COLORS
         for i in all_events:
             event_sub_arr = {}
             event_sub_arr['title'] = f"{i.name} -- {i.service_type}"
@@ -222,48 +244,21 @@ class Engagement(models.Model):
     def working_employees(self):
         return self.employees.count()
 
+    @request_memoized
     def get_vulnerability_summary(self):
-        """Get vulnerability summary for this engagement using optimized database queries"""
-        # Use aggregation to count vulnerabilities in a single query
-        summary_data = self.vulnerabilities.aggregate(
-            critical_open=Count('id', filter=Q(severity='Critical', status='Open')),
-            high_open=Count('id', filter=Q(severity='High', status='Open')),
-            medium_open=Count('id', filter=Q(severity='Medium', status='Open')),
-            low_open=Count('id', filter=Q(severity='Low', status='Open')),
-            critical_fixed=Count('id', filter=Q(severity='Critical', status='Fixed')),
-            high_fixed=Count('id', filter=Q(severity='High', status='Fixed')),
-            medium_fixed=Count('id', filter=Q(severity='Medium', status='Fixed')),
-            low_fixed=Count('id', filter=Q(severity='Low', status='Fixed')),
-        )
-        
-        # Calculate totals
-        summary_data['total_open'] = (
-            summary_data['critical_open'] + summary_data['high_open'] + 
-            summary_data['medium_open'] + summary_data['low_open']
-        )
-        summary_data['total_fixed'] = (
-            summary_data['critical_fixed'] + summary_data['high_fixed'] + 
-            summary_data['medium_fixed'] + summary_data['low_fixed']
-        )
-        
-        return summary_data
+        """Get vulnerability summary for this engagement from its rollup counters"""
+        return VulnerabilityRollup.for_engagement(self).as_summary()
 
     def has_remaining_vulnerabilities(self):
         """Check if engagement has any open vulnerabilities - optimized version"""
         return self.vulnerabilities.filter(status='Open').exists()
 
+    @request_memoized
     def get_vulnerability_risk_score(self):
-        """Calculate a risk score based on vulnerability severity and count"""
-        summary = self.get_vulnerability_summary()
-        # Weight: Critical=10, High=7, Medium=4, Low=1
-        risk_score = (
-            summary['critical_open'] * 10 +
-            summary['high_open'] * 7 +
-            summary['medium_open'] * 4 +
-            summary['low_open'] * 1
-        )
-        return risk_score
+        """Risk score based on open vulnerability severity and count (see VulnerabilityRollup.RISK_WEIGHTS)"""
+        return VulnerabilityRollup.for_engagement(self).risk_score
 
+    @request_memoized
     def get_vulnerability_remediation_rate(self):
         """Calculate the percentage of vulnerabilities that have been fixed"""
         summary = self.get_vulnerability_summary()
@@ -331,6 +326,7 @@ class Engagement(models.Model):
             days_ago = (today - self.end_date).days
             return f"Completed {days_ago} days ago"
 
+    @request_memoized
     def can_be_edited_by(self, user):
         """Check if user has permission to edit this engagement"""
         if user.is_superuser or user.user_type == 'M':
@@ -356,6 +352,77 @@ class Engagement(models.Model):
         return editable_fields
 
 
+class DailyOccupancy(models.Model):
+    """One row per employee, day and kind of booking (Engaged or a leave type) derived from engagements and leaves.
+
+    Kept in step by the signals in signals.py, which only rewrite the date span
+    of the changed engagement or leave for the employees involved. Rebuild it
+    with the rebuild_occupancy command after changing rows behind the ORM's back.
+    """
+    ENGAGED = 'Engaged'
+    KINDS = ((ENGAGED, ENGAGED),) + Leave.LEAVE_TYPES
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+
+    class Meta:
+        unique_together = ('employee', 'date', 'kind')
+        indexes = [
+            models.Index(fields=['date', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} {self.date}: {self.kind}"
+
+    @classmethod
+    def refresh(cls, employee_ids, start_date, end_date):
+        """Recompute the rows of the employees between the dates from their engagements and leaves"""
+        employee_ids = [employee_id for employee_id in set(employee_ids) if employee_id]
+        if not employee_ids or start_date is None or end_date is None or end_date < start_date:
+            return
+
+        spans = [
+            (employee_id, cls.ENGAGED, span_start, span_end)
+            for employee_id, span_start, span_end in Engagement.objects.order_by().filter(
+                employees__in=employee_ids, start_date__lte=end_date, end_date__gte=start_date,
+            ).values_list('employees', 'start_date', 'end_date')
+        ] + [
+            (employee_id, leave_type, span_start, span_end)
+            for employee_id, leave_type, span_start, span_end in Leave.objects.order_by().filter(
+                employee_id__in=employee_ids, start_date__lte=end_date, end_date__gte=start_date,
+            ).values_list('employee_id', 'leave_type', 'start_date', 'end_date')
+        ]
+        rows = set()
+        for employee_id, kind, span_start, span_end in spans:
+            day, last = max(span_start, start_date), min(span_end, end_date)
+            while day <= last:
+                rows.add((employee_id, day, kind))
+                day += datetime.timedelta(days=1)
+
+        with transaction.atomic():
+            cls.objects.filter(employee_id__in=employee_ids, date__range=(start_date, end_date)).delete()
+            cls.objects.bulk_create([cls(employee_id=employee_id, date=day, kind=kind) for employee_id, day, kind in rows],
+                                    batch_size=1000)
+
+    @classmethod
+    def busy_on(cls, day, kinds=None):
+        """Rows of active employees booked on a day, optionally only of some kinds"""
+        rows = cls.objects.filter(date=day, employee__is_active=True)
+        if kinds:
+            rows = rows.filter(kind__in=kinds)
+        return rows
+
+    @classmethod
+    def busy_days(cls, start_date, end_date, kinds=None):
+        """{employee_id: number of distinct days booked between the dates} in one grouped query"""
+        rows = cls.objects.filter(date__range=(start_date, end_date))
+        if kinds:
+            rows = rows.filter(kind__in=kinds)
+        return dict(rows.order_by().values('employee_id').annotate(days=Count('date', distinct=True))
+                    .values_list('employee_id', 'days'))
+
+
 class Comment(models.Model):
     engagement = models.ForeignKey(
         Engagement, on_delete=models.CASCADE, related_name='comments')
@@ -373,6 +440,67 @@ class Comment(models.Model):
         return f'Comment {self.body} by {self.user}'
 
 
+class VulnerabilityQuerySet(models.QuerySet):
+    """Keeps VulnerabilityRollup counters in step with bulk changes, which do not send model signals"""
+
+    ROLLUP_FIELDS = {'severity', 'status', 'engagement', 'engagement_id'}
+
+    def update(self, **kwargs):
+        if not self.ROLLUP_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        # auto_now is not applied by update(), bump it so incremental cube builds see the change
+        kwargs.setdefault('updated_at', timezone.now())
+        with transaction.atomic(using=self.db):
+            engagement_ids = set(self.values_list('engagement_id', flat=True))
+            rows = super().update(**kwargs)
+            new_engagement = kwargs.get('engagement_id', kwargs.get('engagement'))
+            if new_engagement is not None:
+                engagement_ids.add(getattr(new_engagement, 'pk', new_engagement))
+            VulnerabilityRollup.refresh_engagements(engagement_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            VulnerabilityRollup.refresh_engagements({obj.engagement_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if not self.ROLLUP_FIELDS.intersection(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        fields = set(fields) | {'updated_at'}
+        with transaction.atomic(using=self.db):
+            engagement_ids = set(self.model.objects.filter(pk__in=[obj.pk for obj in objs])
+                                 .values_list('engagement_id', flat=True))
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            VulnerabilityRollup.refresh_engagements(engagement_ids | {obj.engagement_id for obj in objs})
+        return rows
+
+    def with_sla(self, today=None):
+        """Annotate sla_days, sla_due_date, days_remaining (a timedelta) and sla_overdue from the SLA policies"""
+        today = today or timezone.now().date()
+        rules = SLAPolicy.rules()
+        return self.annotate(
+            sla_days=SLAPolicy.by_rule(lambda days: days, IntegerField(), rules),
+            sla_due_date=ExpressionWrapper(
+                TruncDate('created_at') + SLAPolicy.by_rule(datetime.timedelta, models.DurationField(), rules),
+                output_field=models.DateField()),
+        ).annotate(
+            days_remaining=ExpressionWrapper(F('sla_due_date') - Value(today, output_field=models.DateField()),
+                                             output_field=models.DurationField()),
+            sla_overdue=Case(When(status='Open', sla_due_date__lt=today, then=Value(True)),
+                             default=Value(False), output_field=models.BooleanField()),
+        )
+
+    def overdue(self, today=None):
+        """Open vulnerabilities past their SLA"""
+        return self.filter(SLAPolicy.overdue_q(today or timezone.now().date()))
+
+
 class Vulnerability(models.Model):
     SEVERITY_CHOICES = [
         ('Critical', 'Critical'),
@@ -385,6 +513,15 @@ class Vulnerability(models.Model):
         ('Open', 'Open'),
         ('Fixed', 'Fixed'),
     ]
+
+    # Days an open vulnerability may stay open before it is overdue
+    SLA_DAYS = {
+        'Critical': 7,
+        'High': 30,
+        'Medium': 90,
+        'Low': 180
+    }
+    DEFAULT_SLA_DAYS = 90
     
     title = models.CharField(max_length=200, verbose_name="Vulnerability Title")
     description = models.TextField(verbose_name="Description")
@@ -399,6 +536,8 @@ class Vulnerability(models.Model):
     fixed_by = models.ForeignKey(Employee, on_delete=models.PROTECT, related_name='fixed_vulnerabilities', null=True, blank=True)
     expected_fix_date = models.DateField(null=True, blank=True, verbose_name="Expected Fix Date")
     
+    objects = VulnerabilityQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']  # We'll handle severity ordering in views
         verbose_name = "Vulnerability"
@@ -406,6 +545,7 @@ class Vulnerability(models.Model):
         indexes = [
             models.Index(fields=['status', 'severity']),
             models.Index(fields=['engagement', 'status']),
+            models.Index(fields=['status', 'severity', 'created_at']),
         ]
     
     def __str__(self):
@@ -463,18 +603,15 @@ class Vulnerability(models.Model):
             return False
         
         if sla_days is None:
-            # Default SLA based on severity
-            sla_mapping = {
-                'Critical': 7,
-                'High': 30,
-                'Medium': 90,
-                'Low': 180
-            }
-            sla_days = sla_mapping.get(self.severity, 90)
+            if hasattr(self, 'sla_overdue'):
+                # Annotated by Vulnerability.objects.with_sla()
+                return self.sla_overdue
+            sla_days = SLAPolicy.days_for(self)
         
         days_open = (timezone.now().date() - self.created_at.date()).days
         return days_open > sla_days
 
+    @request_memoized
     def can_be_edited_by(self, user):
         """Check if user has permission to edit this vulnerability"""
         if user.is_superuser or user.user_type == 'M':
@@ -530,13 +667,325 @@ class Vulnerability(models.Model):
         return errors
 
 
+class SLAPolicy(models.Model):
+    """Days an open vulnerability of one severity may stay open before it is overdue.
+
+    client and service_type narrow a policy down. The most specific matching
+    policy wins (client and service, client, service, global) and severities
+    without any policy fall back to Vulnerability.SLA_DAYS.
+    """
+    severity = models.CharField(max_length=10, choices=Vulnerability.SEVERITY_CHOICES)
+    days = models.PositiveIntegerField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, null=True, blank=True, related_name='sla_policies')
+    service_type = models.ForeignKey(Service, on_delete=models.CASCADE, null=True, blank=True, related_name='sla_policies')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('severity', 'client', 'service_type')
+        verbose_name = "SLA policy"
+        verbose_name_plural = "SLA policies"
+
+    def __str__(self):
+        scope = ' / '.join(str(obj) for obj in (self.client, self.service_type) if obj) or 'All'
+        return f"{self.severity}: {self.days} days ({scope})"
+
+    def clean(self):
+        # unique_together does not catch duplicates with an empty client or service type
+        duplicates = SLAPolicy.objects.filter(severity=self.severity, client=self.client,
+                                              service_type=self.service_type).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError("An SLA policy for this severity and scope already exists.")
+
+    @classmethod
+    @request_memoized
+    def rules(cls):
+        """(severity, client_id, service_type_id, days) tuples, most specific first, ending with the defaults
+
+        Memoized per request, so per-row is_overdue() calls read the policies once.
+        """
+        policies = sorted(cls.objects.values_list('severity', 'client_id', 'service_type_id', 'days'),
+                          key=lambda rule: (rule[1] is None, rule[2] is None))
+        return policies + [(severity, None, None, days) for severity, days in Vulnerability.SLA_DAYS.items()]
+
+    @staticmethod
+    def rule_q(severity, client_id, service_type_id):
+        q = Q(severity=severity)
+        if client_id is not None:
+            q &= Q(engagement__client_id=client_id)
+        if service_type_id is not None:
+            q &= Q(engagement__service_type_id=service_type_id)
+        return q
+
+    @classmethod
+    def by_rule(cls, value, output_field, rules=None):
+        """Case expression giving value(days) for the first rule matching each vulnerability"""
+        rules = cls.rules() if rules is None else rules
+        return Case(
+            *[When(cls.rule_q(severity, client_id, service_type_id), then=Value(value(days)))
+              for severity, client_id, service_type_id, days in rules],
+            default=Value(value(Vulnerability.DEFAULT_SLA_DAYS)),
+            output_field=output_field,
+        )
+
+    @classmethod
+    def overdue_q(cls, today, rules=None):
+        """Open vulnerabilities created before today minus their SLA days"""
+        cutoff = cls.by_rule(lambda days: today - datetime.timedelta(days=days), models.DateField(), rules)
+        return Q(status='Open', created_at__date__lt=cutoff)
+
+    @classmethod
+    def days_for(cls, vulnerability):
+        engagement = vulnerability.engagement
+        for severity, client_id, service_type_id, days in cls.rules():
+            if (severity == vulnerability.severity and client_id in (None, engagement.client_id)
+                    and service_type_id in (None, engagement.service_type_id)):
+                return days
+        return Vulnerability.DEFAULT_SLA_DAYS
+
+
+class VulnerabilityRollup(models.Model):
+    """Denormalized severity x status vulnerability counts for one engagement or one client (exactly one is set).
+
+    Rows are recomputed from the vulnerability table whenever vulnerabilities
+    change (see signals.py and VulnerabilityQuerySet), so summaries are a single
+    row read; reconcile_rollups rebuilds them all.
+    """
+    SEVERITIES = ['Critical', 'High', 'Medium', 'Low']
+    STATUSES = ['Open', 'Fixed']
+    RISK_WEIGHTS = {'Critical': 10, 'High': 7, 'Medium': 4, 'Low': 1}
+    COUNT_FIELDS = ['critical_open', 'critical_fixed', 'high_open', 'high_fixed',
+                    'medium_open', 'medium_fixed', 'low_open', 'low_fixed']
+
+    engagement = models.OneToOneField(Engagement, on_delete=models.CASCADE, null=True, blank=True,
+                                      related_name='vulnerability_rollup')
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, null=True, blank=True,
+                                  related_name='vulnerability_rollup')
+    critical_open = models.IntegerField(default=0)
+    critical_fixed = models.IntegerField(default=0)
+    high_open = models.IntegerField(default=0)
+    high_fixed = models.IntegerField(default=0)
+    medium_open = models.IntegerField(default=0)
+    medium_fixed = models.IntegerField(default=0)
+    low_open = models.IntegerField(default=0)
+    low_fixed = models.IntegerField(default=0)
+    risk_score = models.IntegerField(default=0)
+    engagements_with_vulnerabilities = models.IntegerField(default=0, help_text="Client rows only")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Vulnerability rollup for {self.engagement or self.client}"
+
+    @classmethod
+    def count_aggregates(cls, prefix=''):
+        return {
+            f"{severity.lower()}_{status.lower()}": Count(
+                f"{prefix}id", filter=Q(**{f"{prefix}severity": severity, f"{prefix}status": status}))
+            for severity in cls.SEVERITIES for status in cls.STATUSES
+        }
+
+    @classmethod
+    def risk_score_from(cls, counts):
+        return sum(counts[f"{severity.lower()}_open"] * weight for severity, weight in cls.RISK_WEIGHTS.items())
+
+    @classmethod
+    def refresh_engagement(cls, engagement_id):
+        """Recompute the rollup of one engagement; returns None if the engagement is gone"""
+        if not Engagement.objects.filter(pk=engagement_id).exists():
+            return None
+        counts = Vulnerability.objects.order_by().filter(engagement_id=engagement_id).aggregate(**cls.count_aggregates())
+        counts['risk_score'] = cls.risk_score_from(counts)
+        rollup, _ = cls.objects.update_or_create(engagement_id=engagement_id, defaults=counts)
+        return rollup
+
+    @classmethod
+    def refresh_client(cls, client_id):
+        """Recompute the rollup of one client; returns None if the client is gone"""
+        if not Client.objects.filter(pk=client_id).exists():
+            return None
+        counts = Vulnerability.objects.order_by().filter(engagement__client_id=client_id).aggregate(
+            engagements_with_vulnerabilities=Count('engagement', filter=Q(status='Open'), distinct=True),
+            **cls.count_aggregates(),
+        )
+        counts['risk_score'] = cls.risk_score_from(counts)
+        rollup, _ = cls.objects.update_or_create(client_id=client_id, defaults=counts)
+        return rollup
+
+    @classmethod
+    def refresh_engagements(cls, engagement_ids, client_ids=()):
+        """Recompute the given engagements and the clients they (and client_ids) belong to"""
+        engagement_ids = {pk for pk in engagement_ids if pk is not None}
+        client_ids = {pk for pk in client_ids if pk is not None}
+        if not engagement_ids and not client_ids:
+            return
+        with transaction.atomic():
+            for engagement_id in engagement_ids:
+                cls.refresh_engagement(engagement_id)
+            client_ids.update(Engagement.objects.filter(pk__in=engagement_ids).values_list('client_id', flat=True))
+            for client_id in client_ids:
+                cls.refresh_client(client_id)
+
+    @classmethod
+    def for_engagement(cls, engagement):
+        try:
+            return engagement.vulnerability_rollup
+        except cls.DoesNotExist:
+            rollup = cls.refresh_engagement(engagement.pk)
+            if rollup is not None:
+                # Replaces the cached miss, so later calls don't refresh again
+                engagement.vulnerability_rollup = rollup
+            return rollup
+
+    @classmethod
+    def for_client(cls, client):
+        try:
+            return client.vulnerability_rollup
+        except cls.DoesNotExist:
+            rollup = cls.refresh_client(client.pk)
+            if rollup is not None:
+                # Replaces the cached miss, so later calls don't refresh again
+                client.vulnerability_rollup = rollup
+            return rollup
+
+    def as_summary(self):
+        """Same shape as the former aggregate-based get_vulnerability_summary() results"""
+        summary = {field: getattr(self, field) for field in self.COUNT_FIELDS}
+        summary['total_open'] = sum(getattr(self, f"{severity.lower()}_open") for severity in self.SEVERITIES)
+        summary['total_fixed'] = sum(getattr(self, f"{severity.lower()}_fixed") for severity in self.SEVERITIES)
+        if self.client_id:
+            summary['engagements_with_vulnerabilities'] = self.engagements_with_vulnerabilities
+        return summary
+
+
+class VulnerabilityCube(models.Model):
+    """Pre-aggregated vulnerability counts by client x service type x severity x status x month.
+
+    month is the first day of the month the vulnerability was created in and
+    overdue counts open vulnerabilities past their SLA on the day of the build.
+    Kept current by build_vulnerability_cube (incremental during the day, full
+    rebuild nightly).
+    """
+    DIMENSIONS = {
+        'client': 'client_id',
+        'service': 'service_type_id',
+        'severity': 'severity',
+        'status': 'status',
+        'month': 'month',
+    }
+
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='vulnerability_cube')
+    service_type = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='vulnerability_cube')
+    severity = models.CharField(max_length=10, choices=Vulnerability.SEVERITY_CHOICES)
+    status = models.CharField(max_length=10, choices=Vulnerability.STATUS_CHOICES)
+    month = models.DateField()
+    count = models.IntegerField(default=0)
+    overdue = models.IntegerField(default=0)
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('client', 'service_type', 'severity', 'status', 'month')
+        indexes = [
+            models.Index(fields=['month']),
+            models.Index(fields=['built_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.client_id}/{self.service_type_id}/{self.severity}/{self.status}/{self.month:%Y-%m}: {self.count}"
+
+    @staticmethod
+    def overdue_filter(today, rules=None):
+        return SLAPolicy.overdue_q(today, rules)
+
+    @classmethod
+    def dirty_months(cls, since, now):
+        """Months whose cells may have changed since the last build"""
+        vulnerabilities = Vulnerability.objects.order_by()
+        month = TruncMonth('created_at', output_field=models.DateField())
+
+        # Saved or bulk-updated vulnerabilities
+        months = set(vulnerabilities.filter(updated_at__gte=since).annotate(m=month)
+                     .values_list('m', flat=True).distinct())
+
+        # Open vulnerabilities that crossed their SLA since the last build
+        rules = SLAPolicy.rules()
+        crossed = vulnerabilities.filter(cls.overdue_filter(now.date(), rules)).exclude(
+            cls.overdue_filter(since.date(), rules))
+        months.update(crossed.annotate(m=month).values_list('m', flat=True).distinct())
+
+        # Deletions do not leave a row behind, compare per month totals instead
+        actual = dict(vulnerabilities.annotate(m=month).values('m').annotate(n=Count('id')).values_list('m', 'n'))
+        stored = dict(cls.objects.values('month').annotate(n=Sum('count')).values_list('month', 'n'))
+        months.update(m for m in actual.keys() | stored.keys() if actual.get(m, 0) != stored.get(m, 0))
+        return months
+
+    @classmethod
+    def rebuild(cls, full=False):
+        """Rebuild the cube (every month when full or empty, else only changed months); returns cells written"""
+        now = timezone.now()
+        since = None if full else cls.objects.aggregate(last=Max('built_at'))['last']
+        if since is not None and SLAPolicy.objects.filter(updated_at__gte=since).exists():
+            # Edited SLA policies change overdue counts in every month (deleted ones wait for the nightly full build)
+            since = None
+        months = None if since is None else cls.dirty_months(since, now)
+        if months is not None and not months:
+            return 0
+
+        rows = Vulnerability.objects.order_by().annotate(
+            month=TruncMonth('created_at', output_field=models.DateField())
+        )
+        if months is not None:
+            rows = rows.filter(month__in=months)
+        rows = rows.values(
+            'engagement__client_id', 'engagement__service_type_id', 'severity', 'status', 'month'
+        ).annotate(count=Count('id'), overdue=Count('id', filter=cls.overdue_filter(now.date())))
+
+        cells = [
+            cls(client_id=row['engagement__client_id'], service_type_id=row['engagement__service_type_id'],
+                severity=row['severity'], status=row['status'], month=row['month'],
+                count=row['count'], overdue=row['overdue'], built_at=now)
+            for row in rows
+        ]
+        with transaction.atomic():
+            stale = cls.objects.all() if months is None else cls.objects.filter(month__in=months)
+            stale.delete()
+            cls.objects.bulk_create(cells, batch_size=1000)
+        return len(cells)
+
+    @classmethod
+    def slice(cls, dimensions, client_ids=None, service_ids=None, severities=None, statuses=None,
+              month_from=None, month_to=None):
+        """Sum count and overdue over the cube grouped by the given dimension names"""
+        cells = cls.objects.order_by()
+        if client_ids:
+            cells = cells.filter(client_id__in=client_ids)
+        if service_ids:
+            cells = cells.filter(service_type_id__in=service_ids)
+        if severities:
+            cells = cells.filter(severity__in=severities)
+        if statuses:
+            cells = cells.filter(status__in=statuses)
+        if month_from:
+            cells = cells.filter(month__gte=month_from)
+        if month_to:
+            cells = cells.filter(month__lte=month_to)
+
+        if not dimensions:
+            return [cells.aggregate(count=Coalesce(Sum('count'), 0), overdue=Coalesce(Sum('overdue'), 0))]
+
+        columns = [cls.DIMENSIONS[dimension] for dimension in dimensions]
+        labels = {}
+        if 'client' in dimensions:
+            labels['client_name'] = F('client__name')
+        if 'service' in dimensions:
+            labels['service_name'] = F('service_type__name')
+        return list(cells.values(*columns, **labels).annotate(count=Sum('count'), overdue=Sum('overdue')).order_by(*columns))
+
+
 class Report(models.Model):
     REPORT_TYPES = (("Draft", "Draft"), ("Final", "Final"), ("Verification", "Verification"))
 
     def set_filename(instance, filename):
-        path = "Reports/"
-        name, extension = splitext(filename)
-        return f"{path}{instance.engagement.name}{extension}"
+        # Only the directory and extension are kept, the blob is named after its content
+        return f"Reports/upload{splitext(filename)[1]}"
 
     def validate_file_extension(value):
         if not value.name.endswith('.gpg'):
@@ -545,15 +994,34 @@ class Report(models.Model):
 
     engagement = models.ForeignKey(Engagement, on_delete=models.CASCADE)
     user = models.ForeignKey(Employee, on_delete=models.CASCADE)
-    file = models.FileField(upload_to=set_filename, validators=[validate_file_extension])
+    file = models.FileField(upload_to=set_filename, storage=get_report_storage, validators=[validate_file_extension])
     reference = models.CharField(max_length=36, default=uuid.uuid4)
     report_type = models.CharField(max_length=15, choices=REPORT_TYPES, default="Draft", verbose_name="Report Type")
     note = models.CharField(max_length=60, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
-    def delete(self, *args, **kwargs):
-        self.file.delete()
-        super().delete(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        # A blob is stored and referenced under the lock delete_unreferenced_file takes, so the
+        # cleanup either runs first (and the blob is written again) or sees this row
+        with self._meta.get_field('file').storage.blob_lock():
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def delete_unreferenced_file(cls, name):
+        """Delete a stored blob unless a report still references the same content
+
+        Reports sharing one blob are deleted through the post_delete signal (see
+        signals.py), so cascades and QuerySet.delete() clean up as well.
+        """
+        storage = cls._meta.get_field('file').storage
+        with storage.blob_lock():
+            if name and not cls.objects.filter(file=name).exists():
+                storage.delete(name)
+
+    @property
+    def download_name(self):
+        """Filename offered on download, blobs themselves are named after their hash"""
+        return f"{self.engagement.name}{splitext(self.file.name)[1]}"
     
     def get_vulnerability_summary(self):
         """Get vulnerability summary for this report using optimized database queries"""
@@ -579,4 +1047,39 @@ class Report(models.Model):
             summary_data['medium_fixed'] + summary_data['low_fixed']
         )
         
-        return summary_data
\ No newline at end of file
+        return summary_data
+
+class ReportUpload(models.Model):
+    """A chunked report upload in progress; chunks are appended to a temp file until it is finalized."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    engagement = models.ForeignKey(Engagement, on_delete=models.CASCADE, related_name='report_uploads')
+    user = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='report_uploads')
+    filename = models.CharField(max_length=255)
+    report_type = models.CharField(max_length=15, choices=Report.REPORT_TYPES, default="Draft")
+    note = models.CharField(max_length=60, null=True, blank=True)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Digest declared by the client, verified on finalize")
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class CalendarFeedVersion(models.Model):
+    """Current version of an ICS subscription feed, shared by all workers
+
+    object_id is the employee or client id, 0 for the team feed. The signals
+    start a new version whenever the feed's engagements or leaves change, and
+    of the kind 'all' row, part of every feed's version, on renames.
+    """
+    kind = models.CharField(max_length=10)
+    object_id = models.PositiveIntegerField(default=0)
+    version = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.version}"
@@ -0,0 +1,70 @@
+"""
+Request-scoped memoization of model helpers
+RequestMemoMiddleware gives every request its own store in a context variable (so it
+works the same under threads and ASGI tasks) and drops it when the response is done.
+Methods decorated with @request_memoized compute once per object (or model class, for
+classmethods) and arguments within a request and are not cached at all outside one (shell, management commands, tasks).
+Any model save, delete or m2m change empties the store, see signals.py
+"""
+
+import contextvars
+import functools
+
+from django.db import models
+
+_memo = contextvars.ContextVar('CalendarinhoApp.request_memo', default=None)
+
+
+def memo_key_part(value):
+    """Model instances are keyed by label and pk, so equal rows loaded twice share entries"""
+    if isinstance(value, type) and issubclass(value, models.Model):
+        return value._meta.label
+    if isinstance(value, models.Model):
+        if value.pk is None:
+            raise TypeError("Unsaved instances cannot be memoized")
+        return value._meta.label, value.pk
+    hash(value)
+    return value
+
+
+def request_memoized(method):
+    """Memoize a model method per instance (by pk) and arguments for the current request
+
+    Put it under @classmethod to memoize per model class instead.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        memo = _memo.get()
+        if memo is None or (isinstance(self, models.Model) and self.pk is None):
+            return method(self, *args, **kwargs)
+        try:
+            key = (method.__qualname__, memo_key_part(self),
+                   tuple(memo_key_part(arg) for arg in args),
+                   tuple(sorted((name, memo_key_part(value)) for name, value in kwargs.items())))
+        except TypeError:
+            return method(self, *args, **kwargs)
+        if key not in memo:
+            memo[key] = method(self, *args, **kwargs)
+        return memo[key]
+    return wrapper
+
+
+def clear_request_memo():
+    """Forget everything memoized so far in the current request"""
+    memo = _memo.get()
+    if memo is not None:
+        memo.clear()
+
+
+class RequestMemoMiddleware:
+    """Scope @request_memoized results to one request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _memo.reset(token)
@@ -1,14 +1,19 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Service, Client, Engagement
+from .models import Service, Client, Engagement, Leave
 from .forms import ServiceForm
 import logging
 import datetime
+from collections import Counter
 from django.http import JsonResponse
 from django.utils import timezone
-from django.db.models import Count, Q, Prefetch
+from django.db.models import Count, Q, Prefetch, Avg, Sum, Max, Case, When, F, IntegerField, DurationField, ExpressionWrapper
+from django.db.models.functions import TruncMonth
 from users.models import CustomUser as Employee
-from .models import Vulnerability
+from .models import DailyOccupancy, Vulnerability, VulnerabilityCube, SLAPolicy
+from .conflicts import ConflictReport
+from .business_days import busday_count, clipped_busday_count
+from .metrics import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
@@ -34,32 +39,28 @@ def get_optimized_employee_stats():
     """Get employee statistics with optimized queries"""
     today = timezone.now().date()
     
-    # Get all employees with prefetched related data
-    employees = Employee.objects.exclude(is_active=False).prefetch_related(
-        Prefetch('engagements', queryset=Engagement.objects.filter(
-            start_date__lte=today, end_date__gte=today
-        )),
-        'leave_set'
-    )
-    
     stats = {
-        'total': employees.count(),
+        'total': Employee.objects.exclude(is_active=False).count(),
         'available': 0,
         'engaged': 0,
         'training': 0,
         'vacation': 0
     }
-    
-    for employee in employees:
-        status = employee.currentStatus()[0]
-        if status == 'Available':
-            stats['available'] += 1
-        elif status == 'Engaged':
+
+    # Today's occupancy rows, a leave takes precedence over an engagement as in currentStatus
+    kinds = {}
+    for employee_id, kind in DailyOccupancy.busy_on(today).values_list('employee_id', 'kind'):
+        kinds.setdefault(employee_id, set()).add(kind)
+    for employee_kinds in kinds.values():
+        leave_kinds = sorted(employee_kinds - {DailyOccupancy.ENGAGED})
+        status = leave_kinds[0] if leave_kinds else DailyOccupancy.ENGAGED
+        if status == 'Engaged':
             stats['engaged'] += 1
         elif status == 'Training':
             stats['training'] += 1
         elif status == 'Vacation':
             stats['vacation'] += 1
+    stats['available'] = stats['total'] - len(kinds)
     
     return stats
 
@@ -96,26 +97,85 @@ def get_optimized_client_stats():
 
 def calculate_team_utilization(days=30):
     """Calculate overall team utilization rate"""
-    employees = Employee.objects.exclude(is_active=False)
-    if not employees.exists():
-        return 0
-    
-    total_utilization = 0
-    employee_count = employees.count()
-    
-    for employee in employees:
-        utilization = employee.get_utilization_rate(days)
-        total_utilization += utilization
-    
-    return round(total_utilization / employee_count, 2) if employee_count > 0 else 0
+    return get_dashboard_snapshot(days)['utilization']
+
+def get_dashboard_snapshot(days=30):
+    """Everything on the landing dashboard from one pass over bulk-loaded intervals.
+
+    Statuses and availability are for today (a leave takes precedence over an
+    engagement, as in currentStatus), utilization is the average share of
+    working days active employees were engaged over the last `days` days.
+    Costs a fixed handful of queries whatever the team or history size.
+    """
+    today = timezone.now().date()
+    window_start = today - datetime.timedelta(days=days)
+
+    employee_ids = set(Employee.objects.filter(is_active=True).values_list('id', flat=True))
+    assignments = list(Engagement.objects.order_by().filter(
+        employees__is_active=True, start_date__lte=today, end_date__gte=window_start,
+    ).values_list('employees', 'start_date', 'end_date'))
+    leaves = Leave.objects.order_by('id').filter(
+        employee__is_active=True, start_date__lte=today, end_date__gte=today,
+    ).values_list('employee_id', 'leave_type')
+    ongoing = list(Engagement.objects.select_related('client').annotate(consultants=Count('employees')).filter(
+        start_date__lte=today, end_date__gte=today))
+
+    # Today's status per employee
+    statuses = {}
+    for employee_id, leave_type in leaves:
+        statuses.setdefault(employee_id, leave_type)
+    for employee_id, start_date, end_date in assignments:
+        if start_date <= today <= end_date:
+            statuses.setdefault(employee_id, 'Engaged')
+    status_counts = Counter(statuses.values())
+    employee_stats = {
+        'total': len(employee_ids),
+        'available': len(employee_ids) - len(statuses),
+        'engaged': status_counts['Engaged'],
+        'training': status_counts['Training'],
+        'vacation': status_counts['Vacation'],
+    }
+    availability = "{:2.0f}%".format(100 * len(statuses) / len(employee_ids)) if employee_ids else "100%"
+
+    working_days = busday_count(window_start, today)
+    utilization = 0
+    if employee_ids and working_days:
+        engaged_days = clipped_busday_count([row[1:] for row in assignments], window_start, today)
+        utilization = round(engaged_days / working_days * 100 / len(employee_ids), 2)
+
+    # Progress bars of the ongoing engagements, and ongoing engagements and their consultants per client
+    engagement_bars = sorted(({
+        'engid': eng.id,
+        'engName': eng.name,
+        'precent': eng.days_left_percentage(),
+        'start_date': eng.start_date,
+        'end_date': eng.end_date,
+    } for eng in ongoing), key=lambda bar: bar['precent'])
+    clients, client_counts = {}, Counter()
+    for eng in ongoing:
+        client = clients.setdefault(eng.client_id, eng.client)
+        client.ongoing_consultants = getattr(client, 'ongoing_consultants', 0) + eng.consultants
+        client_counts[client] += 1
+    client_bars = dict(client_counts.most_common())
+
+    return {
+        'employees': employee_stats,
+        'engagements': get_optimized_engagement_stats(),
+        'clients': {'total': Client.objects.count(), 'active': len(client_bars)},
+        'utilization': utilization,
+        'availability': availability,
+        'engagement_bars': engagement_bars,
+        'client_bars': client_bars,
+    }
 
 def get_dashboard_summary():
     """Get comprehensive dashboard summary with optimized queries"""
+    snapshot = get_dashboard_snapshot()
     return {
-        'employees': get_optimized_employee_stats(),
-        'engagements': get_optimized_engagement_stats(),
-        'clients': get_optimized_client_stats(),
-        'utilization': calculate_team_utilization()
+        'employees': snapshot['employees'],
+        'engagements': snapshot['engagements'],
+        'clients': snapshot['clients'],
+        'utilization': snapshot['utilization']
     }
 
 def get_enhanced_employee_data():
@@ -495,6 +555,31 @@ def get_employee_availability_matrix(start_date=None, end_date=None):
     
     return availability_matrix
 
+def get_employee_service_matrix(employees, services, start_date=None, end_date=None):
+    """Engagement counts per employee x service type as a dense numpy matrix
+
+    Rows follow employees and columns follow services. The counts come from one
+    grouped query over the engagement/employee pairs; with a date range only
+    engagements overlapping it are counted.
+    """
+    import numpy as np
+
+    rows = {emp.id: index for index, emp in enumerate(employees)}
+    columns = {srv.id: index for index, srv in enumerate(services)}
+    matrix = np.zeros((len(rows), len(columns)), dtype=np.int64)
+    if not rows or not columns:
+        return matrix
+
+    engagements = Engagement.objects.order_by().filter(employees__in=list(rows), service_type__in=list(columns))
+    if start_date:
+        engagements = engagements.filter(end_date__gte=start_date)
+    if end_date:
+        engagements = engagements.filter(start_date__lte=end_date)
+
+    for pair in engagements.values('employees', 'service_type').annotate(count=Count('id')):
+        matrix[rows[pair['employees']], columns[pair['service_type']]] = pair['count']
+    return matrix
+
 def get_workload_distribution():
     """Get workload distribution across employees"""
     today = timezone.now().date()
@@ -540,7 +625,7 @@ def get_workload_distribution():
 
 def get_client_risk_assessment():
     """Get client risk assessment based on vulnerabilities and engagement activity"""
-    clients = Client.objects.prefetch_related('engagements__vulnerabilities').all()
+    clients = Client.objects.select_related('vulnerability_rollup').prefetch_related('engagements')
     risk_assessments = []
     
     for client in clients:
@@ -593,16 +678,30 @@ def get_client_risk_assessment():
     
     return risk_assessments
 
-def get_engagement_timeline_conflicts(days_ahead=90):
-    """Identify potential timeline conflicts for upcoming engagements"""
+# Warn when an engagement runs alongside this many other engagements on one day
+CONCURRENT_ENGAGEMENT_WARNING = 5
+# Longest look-ahead and report window, in days
+CONFLICT_REPORT_MAX_DAYS = 366
+
+
+def get_timeline_conflict_report(days_ahead=90):
+    """Conflicts of engagements starting in the next days_ahead days and the ConflictReport they come from
+
+    The report covers today until the last of those engagements ends, at most
+    CONFLICT_REPORT_MAX_DAYS ahead, loaded once and swept per employee instead
+    of an overlap check per assignment.
+    """
     today = timezone.now().date()
+    days_ahead = min(max(days_ahead, 1), CONFLICT_REPORT_MAX_DAYS)
     future_date = today + timezone.timedelta(days=days_ahead)
     
-    upcoming_engagements = Engagement.objects.filter(
+    upcoming_engagements = list(Engagement.objects.filter(
         start_date__gte=today,
         start_date__lte=future_date
-    ).select_related('client', 'service_type').prefetch_related('employees')
+    ).select_related('client').order_by('start_date'))
     
+    last_day = today + timezone.timedelta(days=CONFLICT_REPORT_MAX_DAYS)
+    report = ConflictReport(today, min(max([future_date] + [eng.end_date for eng in upcoming_engagements]), last_day))
     conflicts = []
     
     for engagement in upcoming_engagements:
@@ -612,34 +711,29 @@ def get_engagement_timeline_conflicts(days_ahead=90):
             'client_name': engagement.client.name,
             'start_date': engagement.start_date,
             'end_date': engagement.end_date,
-            'employee_conflicts': [],
+            'employee_conflicts': report.engagement_conflicts(engagement.id),
             'resource_warnings': []
         }
         
-        # Check for employee conflicts
-        for employee in engagement.employees.all():
-            if employee.overlapCheck(engagement.start_date, engagement.end_date):
-                conflict_info['employee_conflicts'].append({
-                    'employee_name': employee.get_full_name(),
-                    'employee_id': employee.id
-                })
-        
-        # Check for resource warnings (too many concurrent engagements)
-        concurrent_engagements = Engagement.objects.filter(
-            start_date__lte=engagement.end_date,
-            end_date__gte=engagement.start_date
-        ).exclude(id=engagement.id).count()
-        
-        if concurrent_engagements >= 5:  # Threshold for resource warning
+        # Check for resource warnings (too many engagements running on the same day)
+        peak, peak_date = report.peak_concurrency(engagement.start_date, engagement.end_date)
+        conflict_info['peak_concurrency'] = peak
+        conflict_info['peak_date'] = peak_date
+        if peak - 1 >= CONCURRENT_ENGAGEMENT_WARNING:
             conflict_info['resource_warnings'].append(
-                f"{concurrent_engagements} concurrent engagements during this period"
+                f"{peak - 1} concurrent engagements on {peak_date}"
             )
         
         # Only include engagements with conflicts or warnings
         if conflict_info['employee_conflicts'] or conflict_info['resource_warnings']:
             conflicts.append(conflict_info)
     
-    return conflicts
+    return conflicts, report
+
+
+def get_engagement_timeline_conflicts(days_ahead=90):
+    """Identify potential timeline conflicts for upcoming engagements"""
+    return get_timeline_conflict_report(days_ahead)[0]
 
 @login_required
 def api_employee_stats(request):
@@ -728,11 +822,16 @@ def api_timeline_conflicts(request):
         days_ahead = int(days_ahead)
     except (ValueError, TypeError):
         days_ahead = 90
+    if not 1 <= days_ahead <= CONFLICT_REPORT_MAX_DAYS:
+        return JsonResponse({'success': False, 'error': f'days_ahead must be 1 to {CONFLICT_REPORT_MAX_DAYS}'},
+                            status=400)
     
-    data = get_engagement_timeline_conflicts(days_ahead)
+    data, report = get_timeline_conflict_report(days_ahead)
     return JsonResponse({
         'success': True,
-        'data': data
+        'data': data,
+        'double_bookings': report.double_bookings,
+        'daily_concurrency': report.daily_concurrency(),
     })
 
 @login_required
@@ -750,13 +849,14 @@ def get_vulnerability_analytics(client_ids=None):
 
     If client_ids is provided (iterable of ints), restrict to vulnerabilities
     under engagements belonging to those clients.
+
+    Everything is computed with grouped aggregates, so the number of queries
+    does not depend on how many vulnerabilities or engagements there are.
     """
     today = timezone.now().date()
     
-    # Get all vulnerabilities with related data
-    vulnerabilities = Vulnerability.objects.select_related(
-        'engagement__client', 'created_by', 'fixed_by'
-    ).all()
+    vulnerabilities = Vulnerability.objects.order_by()
+    clients = Client.objects.all()
 
     # Apply client filter when requested
     if client_ids:
@@ -766,11 +866,14 @@ def get_vulnerability_analytics(client_ids=None):
             client_ids = []
         if len(client_ids) > 0:
             vulnerabilities = vulnerabilities.filter(engagement__client_id__in=client_ids)
+            clients = clients.filter(id__in=client_ids)
     
     analytics = {
-        'total_count': vulnerabilities.count(),
-        'severity_breakdown': {},
-        'status_breakdown': {},
+        'total_count': 0,
+        'severity_breakdown': {
+            severity: {'open': 0, 'fixed': 0} for severity in ['Critical', 'High', 'Medium', 'Low']
+        },
+        'status_breakdown': {'open': 0, 'fixed': 0},
         'overdue_count': 0,
         'recently_fixed': 0,
         'average_time_to_fix': 0,
@@ -779,56 +882,34 @@ def get_vulnerability_analytics(client_ids=None):
         'monthly_trend': []
     }
     
-    # Calculate severity and status breakdowns
-    for severity in ['Critical', 'High', 'Medium', 'Low']:
-        analytics['severity_breakdown'][severity] = {
-            'open': vulnerabilities.filter(severity=severity, status='Open').count(),
-            'fixed': vulnerabilities.filter(severity=severity, status='Fixed').count()
-        }
-    
-    analytics['status_breakdown'] = {
-        'open': vulnerabilities.filter(status='Open').count(),
-        'fixed': vulnerabilities.filter(status='Fixed').count()
-    }
-    
-    # Calculate overdue vulnerabilities
-    severity_sla = {
-        'Critical': 7,
-        'High': 30,
-        'Medium': 90,
-        'Low': 180
-    }
-    
-    overdue_count = 0
-    for severity, days in severity_sla.items():
-        cutoff_date = today - timezone.timedelta(days=days)
-        overdue_count += vulnerabilities.filter(
-            severity=severity,
-            status='Open',
-            created_at__date__lte=cutoff_date
-        ).count()
-    
-    analytics['overdue_count'] = overdue_count
-    
     # Recently fixed (last 30 days)
     recent_fixed_date = today - timezone.timedelta(days=30)
-    analytics['recently_fixed'] = vulnerabilities.filter(
-        status='Fixed',
-        fixed_at__date__gte=recent_fixed_date
-    ).count()
-    
-    # Average time to fix
-    fixed_vulns = vulnerabilities.filter(status='Fixed', fixed_at__isnull=False)
-    if fixed_vulns.exists():
-        total_days = sum(
-            (vuln.fixed_at.date() - vuln.created_at.date()).days 
-            for vuln in fixed_vulns
-        )
-        analytics['average_time_to_fix'] = round(total_days / fixed_vulns.count(), 1)
+
+    # Severity x status breakdown, overdue and recently fixed counts in one grouped query
+    groups = vulnerabilities.values('severity', 'status').annotate(
+        count=Count('id'),
+        overdue=Count('id', filter=SLAPolicy.overdue_q(today)),
+        recently_fixed=Count('id', filter=Q(status='Fixed', fixed_at__date__gte=recent_fixed_date)),
+    )
+    for group in groups:
+        status_key = group['status'].lower()
+        analytics['total_count'] += group['count']
+        analytics['overdue_count'] += group['overdue']
+        analytics['recently_fixed'] += group['recently_fixed']
+        if status_key in analytics['status_breakdown']:
+            analytics['status_breakdown'][status_key] += group['count']
+        if group['severity'] in analytics['severity_breakdown'] and status_key in ('open', 'fixed'):
+            analytics['severity_breakdown'][group['severity']][status_key] += group['count']
+    
+    # Average time to fix, in days, computed by the database
+    average_fix = vulnerabilities.filter(status='Fixed', fixed_at__isnull=False).aggregate(
+        average=Avg(ExpressionWrapper(F('fixed_at') - F('created_at'), output_field=DurationField()))
+    )['average']
+    if average_fix is not None:
+        analytics['average_time_to_fix'] = round(average_fix.total_seconds() / 86400, 1)
     
     # Top vulnerable clients
-    from django.db.models import Count
-    client_vuln_counts = Client.objects.annotate(
+    client_vuln_counts = clients.annotate(
         open_vuln_count=Count('engagements__vulnerabilities', 
                             filter=Q(engagements__vulnerabilities__status='Open'))
     ).filter(open_vuln_count__gt=0).order_by('-open_vuln_count')[:5]
@@ -842,12 +923,21 @@ def get_vulnerability_analytics(client_ids=None):
         for client in client_vuln_counts
     ]
     
-    # Engagement risk distribution
-    engagements_with_vulns = Engagement.objects.prefetch_related('vulnerabilities').all()
+    # Engagement risk distribution, using the Engagement.get_vulnerability_risk_score weights
+    # (Critical=10, High=7, Medium=4, Low=1 per open vulnerability) summed per engagement
+    risk_scores = vulnerabilities.filter(status='Open').values('engagement').annotate(
+        risk_score=Sum(Case(
+            When(severity='Critical', then=10),
+            When(severity='High', then=7),
+            When(severity='Medium', then=4),
+            When(severity='Low', then=1),
+            default=0,
+            output_field=IntegerField(),
+        ))
+    ).values_list('risk_score', flat=True)
     risk_distribution = {'low': 0, 'medium': 0, 'high': 0, 'critical': 0}
     
-    for eng in engagements_with_vulns:
-        risk_score = eng.get_vulnerability_risk_score()
+    for risk_score in risk_scores:
         if risk_score == 0:
             continue
         elif risk_score <= 10:
@@ -860,6 +950,31 @@ def get_vulnerability_analytics(client_ids=None):
             risk_distribution['critical'] += 1
     
     analytics['engagement_risk_distribution'] = risk_distribution
+
+    # Reported and fixed vulnerabilities per month over the last 12 months
+    first_month = (today.replace(day=1) - timezone.timedelta(days=320)).replace(day=1)
+    reported_by_month = dict(
+        vulnerabilities.filter(created_at__date__gte=first_month)
+        .annotate(month=TruncMonth('created_at')).values('month')
+        .annotate(count=Count('id')).values_list('month', 'count')
+    )
+    fixed_by_month = dict(
+        vulnerabilities.filter(status='Fixed', fixed_at__date__gte=first_month)
+        .annotate(month=TruncMonth('fixed_at')).values('month')
+        .annotate(count=Count('id')).values_list('month', 'count')
+    )
+    reported_by_month = {month.strftime('%Y-%m'): count for month, count in reported_by_month.items()}
+    fixed_by_month = {month.strftime('%Y-%m'): count for month, count in fixed_by_month.items()}
+
+    month = first_month
+    while month <= today:
+        key = month.strftime('%Y-%m')
+        analytics['monthly_trend'].append({
+            'month': key,
+            'reported': reported_by_month.get(key, 0),
+            'fixed': fixed_by_month.get(key, 0),
+        })
+        month = (month + timezone.timedelta(days=32)).replace(day=1)
     
     return analytics
 
@@ -875,13 +990,8 @@ def get_performance_metrics():
     ).count()
     
     # Team utilization over time
-    employees = Employee.objects.exclude(is_active=False)
-    total_employees = employees.count()
-    engaged_employees = 0
-    
-    for emp in employees:
-        if emp.engagements.filter(start_date__lte=today, end_date__gte=today).exists():
-            engaged_employees += 1
+    total_employees = Employee.objects.exclude(is_active=False).count()
+    engaged_employees = DailyOccupancy.busy_on(today, [DailyOccupancy.ENGAGED]).count()
     
     utilization_rate = round((engaged_employees / total_employees * 100), 2) if total_employees > 0 else 0
     
@@ -944,6 +1054,56 @@ def api_vulnerability_analytics(request):
     })
 
 
+def parse_cube_month(value):
+    """Parse YYYY-MM (or a full date) into the first day of that month"""
+    return datetime.datetime.strptime(value[:7], '%Y-%m').date()
+
+
+@login_required
+def api_vulnerability_cube(request):
+    """Slice the pre-aggregated vulnerability cube.
+
+    ?dimensions=client,service,severity,status,month (any subset, comma separated)
+    and optional filters client_ids, service_ids, severity, status (comma
+    separated) and month_from/month_to (YYYY-MM).
+    """
+    def csv_param(name):
+        return [value.strip() for value in request.GET.get(name, '').split(',') if value.strip()]
+
+    dimensions = csv_param('dimensions')
+    unknown = [dimension for dimension in dimensions if dimension not in VulnerabilityCube.DIMENSIONS]
+    if unknown:
+        return JsonResponse({
+            'success': False,
+            'error': f"Unknown dimension(s): {', '.join(unknown)}. "
+                     f"Use any of: {', '.join(VulnerabilityCube.DIMENSIONS)}"
+        }, status=400)
+
+    try:
+        client_ids = [int(value) for value in csv_param('client_ids')]
+        service_ids = [int(value) for value in csv_param('service_ids')]
+        month_from = parse_cube_month(request.GET['month_from']) if request.GET.get('month_from') else None
+        month_to = parse_cube_month(request.GET['month_to']) if request.GET.get('month_to') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid id or month filter'}, status=400)
+
+    rows = VulnerabilityCube.slice(
+        dimensions, client_ids=client_ids, service_ids=service_ids,
+        severities=csv_param('severity'), statuses=csv_param('status'),
+        month_from=month_from, month_to=month_to,
+    )
+    for row in rows:
+        if row.get('month'):
+            row['month'] = row['month'].strftime('%Y-%m')
+
+    return JsonResponse({
+        'success': True,
+        'dimensions': dimensions,
+        'rows': rows,
+        'built_at': VulnerabilityCube.objects.aggregate(last=Max('built_at'))['last'],
+    })
+
+
 @login_required
 def api_performance_metrics(request):
     """API endpoint for performance metrics"""
@@ -1181,10 +1341,14 @@ def _set_cache(key, data):
     }
 
 def _get_cache(key):
-    """Get cache entry if valid"""
+    """Get cache entry if valid, dropping it once it has expired"""
     cache_entry = _dashboard_cache.get(key)
     if _is_cache_valid(cache_entry):
+        CACHE_HITS.inc(cache='dashboard')
         return cache_entry['data']
+    CACHE_MISSES.inc(cache='dashboard')
+    if cache_entry is not None and _dashboard_cache.pop(key, None) is not None:
+        CACHE_EVICTIONS.inc(cache='dashboard')
     return None
 
 def calculate_enhanced_team_utilization(start_date, end_date):
@@ -1214,18 +1378,12 @@ def calculate_enhanced_team_utilization(start_date, end_date):
     utilization_data = []
     total_utilization = 0
     
+    # Working days (holidays excluded) are the same for everyone
+    working_days = busday_count(start_date, end_date)
+    
     for emp in employees:
         engaged_days = emp.countEngDays(start_date, end_date)
         
-        # Calculate weekdays only using proper business day calculation
-        import numpy as np
-        from django.conf import settings
-        working_days = np.busday_count(
-            start_date, 
-            end_date + timezone.timedelta(days=1),
-            weekmask=settings.WORKING_DAYS
-        )
-        
         # Calculate utilization rate - this shows percentage of business days spent on client engagements
         # Note: 100% would mean working on engagements every single business day (unrealistic)
         # Typically 70-80% is considered high utilization in consulting
@@ -1325,18 +1483,10 @@ def calculate_financial_intelligence(start_date, end_date):
     total_utilization = 0
     employee_count = 0
     
+    working_days = busday_count(start_date, end_date)
     for emp_cost_data in employee_costs:
         if emp_cost_data['engaged_days'] > 0:
             emp = emp_cost_data['employee']
-            # Calculate weekdays only
-            import numpy as np
-            from django.conf import settings
-            working_days = np.busday_count(
-                start_date, 
-                end_date + timezone.timedelta(days=1),
-                weekmask=settings.WORKING_DAYS
-            )
-            
             if working_days > 0:
                 emp_utilization = round((emp_cost_data['engaged_days'] / working_days) * 100, 2)
                 total_utilization += emp_utilization
@@ -0,0 +1,235 @@
+"""
+Signal handlers keeping VulnerabilityRollup counters in step with Vulnerability changes,
+DailyOccupancy and the ICS feed versions in step with engagements and leaves (and the
+feed versions with renames), the business-day calendar in step with holidays, report blobs in step with report deletes
+and request memos in step with any write
+Bulk QuerySet.update/bulk_create/bulk_update are covered by VulnerabilityQuerySet
+"""
+
+from django.db import transaction
+from django.db.models import Max, Min, QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (Client, DailyOccupancy, Employee, Engagement, Holiday, Leave, Report, Service, Vulnerability,
+                     VulnerabilityRollup)
+from .business_days import clear_busdaycalendar
+from .ics_feeds import invalidate_all_feeds, invalidate_feeds
+from .request_memo import clear_request_memo
+
+
+def deleted_with_engagement(origin):
+    """True when a delete cascades from an Engagement, whose own handler refreshes the client"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Engagement
+    return isinstance(origin, Engagement)
+
+
+@receiver(pre_save, sender=Vulnerability)
+def remember_vulnerability_engagement(sender, instance, raw=False, **kwargs):
+    # A vulnerability moved to another engagement must also update the old one
+    instance._previous_engagement_id = None
+    if instance.pk and not raw:
+        instance._previous_engagement_id = sender.objects.filter(pk=instance.pk).values_list(
+            'engagement_id', flat=True).first()
+
+
+@receiver(post_save, sender=Vulnerability)
+def refresh_rollups_on_vulnerability_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    VulnerabilityRollup.refresh_engagements({instance.engagement_id, getattr(instance, '_previous_engagement_id', None)})
+
+
+@receiver(pre_delete, sender=Vulnerability)
+def remember_deleted_vulnerability_engagement(sender, instance, origin=None, **kwargs):
+    # The instance may predate a bulk move, use the engagement it has in the database
+    instance._previous_engagement_id = None
+    if not deleted_with_engagement(origin):
+        instance._previous_engagement_id = sender.objects.filter(pk=instance.pk).values_list(
+            'engagement_id', flat=True).first()
+
+
+@receiver(post_delete, sender=Vulnerability)
+def refresh_rollups_on_vulnerability_delete(sender, instance, origin=None, **kwargs):
+    if deleted_with_engagement(origin):
+        return
+    VulnerabilityRollup.refresh_engagements({getattr(instance, '_previous_engagement_id', None) or instance.engagement_id})
+
+
+@receiver(pre_save, sender=Engagement)
+def remember_engagement_state(sender, instance, raw=False, **kwargs):
+    # The client for the rollups and the dates for the occupancy span
+    instance._previous_client_id = instance._previous_dates = None
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).values_list('client_id', 'start_date', 'end_date').first()
+        if previous:
+            instance._previous_client_id = previous[0]
+            instance._previous_dates = previous[1:]
+
+
+@receiver(post_save, sender=Engagement)
+def refresh_rollups_on_engagement_move(sender, instance, created=False, raw=False, **kwargs):
+    previous_client_id = getattr(instance, '_previous_client_id', None)
+    if raw or created or previous_client_id in (None, instance.client_id):
+        return
+    VulnerabilityRollup.refresh_engagements(set(), client_ids={previous_client_id, instance.client_id})
+
+
+@receiver(post_delete, sender=Engagement)
+def refresh_client_rollup_on_engagement_delete(sender, instance, **kwargs):
+    VulnerabilityRollup.refresh_engagements(set(), client_ids={instance.client_id})
+
+
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def rebuild_busdaycalendar_on_holiday_change(sender, **kwargs):
+    clear_busdaycalendar()
+
+
+def occupancy_span(*dates):
+    dates = [day for day in dates if day]
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+@receiver(post_save, sender=Engagement)
+def refresh_occupancy_on_engagement_save(sender, instance, created=False, raw=False, **kwargs):
+    # New engagements get their employees through m2m_changed
+    if raw or created:
+        return
+    previous_dates = getattr(instance, '_previous_dates', None) or ()
+    if tuple(previous_dates) == (instance.start_date, instance.end_date):
+        return
+    DailyOccupancy.refresh(instance.employees.values_list('id', flat=True),
+                           *occupancy_span(instance.start_date, instance.end_date, *previous_dates))
+
+
+@receiver(m2m_changed, sender=Engagement.employees.through)
+def refresh_occupancy_on_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # The cleared rows are gone by post_clear, remember what they covered
+        if reverse:
+            instance._cleared_occupancy = ([instance.pk], *occupancy_span(
+                *instance.engagements.aggregate(start=Min('start_date'), end=Max('end_date')).values()))
+        else:
+            instance._cleared_occupancy = (list(instance.employees.values_list('id', flat=True)),
+                                           instance.start_date, instance.end_date)
+    elif action == 'post_clear':
+        DailyOccupancy.refresh(*getattr(instance, '_cleared_occupancy', ((), None, None)))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        if reverse:
+            span = Engagement.objects.filter(pk__in=pk_set).aggregate(start=Min('start_date'), end=Max('end_date'))
+            DailyOccupancy.refresh([instance.pk], span['start'], span['end'])
+        else:
+            DailyOccupancy.refresh(pk_set, instance.start_date, instance.end_date)
+
+
+@receiver(pre_delete, sender=Engagement)
+def remember_engagement_employees(sender, instance, **kwargs):
+    instance._occupancy_employee_ids = list(instance.employees.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Engagement)
+def refresh_occupancy_on_engagement_delete(sender, instance, **kwargs):
+    DailyOccupancy.refresh(getattr(instance, '_occupancy_employee_ids', ()), instance.start_date, instance.end_date)
+
+
+@receiver(pre_save, sender=Leave)
+def remember_leave_span(sender, instance, raw=False, **kwargs):
+    instance._previous_span = None
+    if instance.pk and not raw:
+        instance._previous_span = sender.objects.filter(pk=instance.pk).values_list(
+            'employee_id', 'start_date', 'end_date').first()
+
+
+@receiver(post_save, sender=Leave)
+def refresh_occupancy_on_leave_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_span', None)
+    if previous and previous[0] != instance.employee_id:
+        DailyOccupancy.refresh([previous[0]], previous[1], previous[2])
+        previous = None
+    DailyOccupancy.refresh([instance.employee_id],
+                           *occupancy_span(instance.start_date, instance.end_date, *(previous or ())[1:]))
+
+
+@receiver(post_delete, sender=Leave)
+def refresh_occupancy_on_leave_delete(sender, instance, **kwargs):
+    DailyOccupancy.refresh([instance.employee_id], instance.start_date, instance.end_date)
+
+
+@receiver(post_save, sender=Engagement)
+@receiver(post_delete, sender=Engagement)
+def invalidate_ics_feeds_on_engagement_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    employee_ids = getattr(instance, '_occupancy_employee_ids', None)
+    if employee_ids is None:
+        employee_ids = instance.employees.values_list('id', flat=True)
+    invalidate_feeds(employee_ids, {instance.client_id, getattr(instance, '_previous_client_id', None)})
+
+
+@receiver(m2m_changed, sender=Engagement.employees.through)
+def invalidate_ics_feeds_on_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_client_ids = list(instance.engagements.values_list('client_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if action == 'post_clear':
+            client_ids = getattr(instance, '_cleared_client_ids', ())
+        else:
+            client_ids = Engagement.objects.filter(pk__in=pk_set).values_list('client_id', flat=True)
+        invalidate_feeds([instance.pk], client_ids)
+    else:
+        employee_ids = pk_set or getattr(instance, '_cleared_occupancy', ((),))[0]
+        invalidate_feeds(employee_ids, [instance.client_id])
+
+
+@receiver(post_save, sender=Leave)
+@receiver(post_delete, sender=Leave)
+def invalidate_ics_feeds_on_leave_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_feeds({instance.employee_id, (getattr(instance, '_previous_span', None) or (None,))[0]})
+
+
+# Names shown in ICS feeds other than the renamed object's own
+ICS_FEED_NAME_FIELDS = {Client: ('name',), Service: ('name',), Employee: ('first_name', 'last_name')}
+
+
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Service)
+@receiver(pre_save, sender=Employee)
+def remember_ics_feed_names(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Employees are saved on every login, only a save that can change a name costs a query
+    fields = ICS_FEED_NAME_FIELDS[sender]
+    instance._previous_feed_names = None
+    if instance.pk and not raw and (update_fields is None or set(fields) & set(update_fields)):
+        instance._previous_feed_names = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Employee)
+def invalidate_ics_feeds_on_rename(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_feed_names', None)
+    if previous is not None and previous != tuple(getattr(instance, field) for field in ICS_FEED_NAME_FIELDS[sender]):
+        invalidate_all_feeds()
+
+
+@receiver(post_delete, sender=Report)
+def delete_report_blob(sender, instance, **kwargs):
+    # Also runs for cascades and QuerySet.delete(); after commit, so a rolled back delete keeps its file
+    name = instance.file.name
+    if name:
+        transaction.on_commit(lambda: Report.delete_unreferenced_file(name))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(m2m_changed)
+def clear_request_memo_on_write(sender, **kwargs):
+    # Memoized helpers read across models (rollups, assignments), so any write empties the memo
+    clear_request_memo()
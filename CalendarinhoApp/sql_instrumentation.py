@@ -0,0 +1,226 @@
+"""
+Per-request SQL instrumentation that works with DEBUG off
+SQLInstrumentationMiddleware wraps every database connection with an execute_wrapper for
+the duration of a request to count queries, SQL time and repeated statement shapes (the
+SQL with literals and IN lists collapsed). A SELECT shape run more than
+SQL_N_PLUS_ONE_THRESHOLD times is logged as a likely N+1 with the application line that
+ran it. Responses to staff users (or all of them with SQL_SERVER_TIMING) get a
+Server-Timing header and the totals are added to per-view counters in the cache, shared by
+all workers when the cache is, for api_sql_report.
+Queries run while a streaming response is consumed are not counted
+"""
+
+import logging
+import os
+import re
+import sys
+import sysconfig
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import connections
+from django.http import JsonResponse
+from django.urls import URLResolver, get_resolver
+from django.views.decorators.http import require_http_methods
+
+logger = logging.getLogger(__name__)
+
+SQL_STATS_PREFIX = 'sqlstats'
+SQL_STATS_COUNTERS = ('requests', 'queries', 'sql_us', 'duplicates', 'n_plus_one')
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+_placeholder = re.compile(r"%s|\?")
+_in_list = re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE)
+_whitespace = re.compile(r"\s+")
+
+# Frames skipped when looking for the application line that ran a query
+_ignored_frames = (__file__, os.path.dirname(django.__file__), sysconfig.get_paths()['stdlib'])
+
+
+def normalize_sql(sql):
+    """Statement shape: literals and placeholders as ?, IN lists as IN (...)"""
+    sql = _whitespace.sub(' ', sql).strip()
+    sql = _string_literal.sub('?', sql)
+    sql = _number_literal.sub('?', sql)
+    sql = _placeholder.sub('?', sql)
+    return _in_list.sub('IN (...)', sql)
+
+
+def call_site():
+    """file:line (function) of the innermost frame outside Django and this module"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_ignored_frames) and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return None
+
+
+class QueryStats:
+    """execute_wrapper collecting the queries of one request"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = 0
+        self.duration = 0.0
+        self.shapes = {}
+        self.n_plus_one = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+            shape = normalize_sql(sql)
+            count = self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            # Only the run that crosses the threshold walks the stack, its call site is the loop's
+            if count == self.threshold + 1 and shape.upper().startswith('SELECT'):
+                self.n_plus_one.append({'sql': shape, 'call_site': call_site()})
+
+    @property
+    def duplicates(self):
+        """Queries repeating a shape already run in the request"""
+        return self.queries - len(self.shapes)
+
+    def repeats(self, shape):
+        return self.shapes.get(shape, 0)
+
+
+def stats_key(view_name, field):
+    return f"{SQL_STATS_PREFIX}:{view_name}:{field}"
+
+
+def add_to_counter(key, value):
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # First count of the view (or culled), add() only creates it once across workers
+        if not cache.add(key, value, None):
+            cache.incr(key, value)
+
+
+def record_view_stats(view_name, stats):
+    """Add a request's totals to the view's counters, one atomic incr per non-zero counter"""
+    values = {
+        'requests': 1,
+        'queries': stats.queries,
+        'sql_us': round(stats.duration * 1e6),
+        'duplicates': stats.duplicates,
+        'n_plus_one': len(stats.n_plus_one),
+    }
+    for field, value in values.items():
+        if value:
+            add_to_counter(stats_key(view_name, field), value)
+    max_key = stats_key(view_name, 'max_queries')
+    if stats.queries > (cache.get(max_key) or 0):
+        cache.set(max_key, stats.queries, None)
+    if stats.n_plus_one:
+        cache.set(stats_key(view_name, 'last_n_plus_one'),
+                  [dict(sample, repeats=stats.repeats(sample['sql'])) for sample in stats.n_plus_one], None)
+
+
+def url_view_names(patterns=None, namespace=''):
+    """Every view name resolver_match.view_name can take, so the report needs no list of seen views"""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            child = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            yield from url_view_names(pattern.url_patterns, child)
+        else:
+            yield namespace + (pattern.name or pattern.lookup_str)
+
+
+def view_report():
+    """Aggregated counters of every instrumented view, most queries first"""
+    views = sorted(set(url_view_names()))
+    fields = SQL_STATS_COUNTERS + ('max_queries', 'last_n_plus_one')
+    values = cache.get_many([stats_key(view_name, field) for view_name in views for field in fields])
+    report = []
+    for view_name in views:
+        row = {field: values.get(stats_key(view_name, field), 0) for field in SQL_STATS_COUNTERS}
+        if not row['requests']:
+            continue
+        report.append({
+            'view': view_name,
+            'requests': row['requests'],
+            'queries': row['queries'],
+            'avg_queries': round(row['queries'] / row['requests'], 2),
+            'max_queries': values.get(stats_key(view_name, 'max_queries'), 0),
+            'avg_sql_ms': round(row['sql_us'] / row['requests'] / 1000, 3),
+            'duplicates': row['duplicates'],
+            'n_plus_one_requests': row['n_plus_one'],
+            'last_n_plus_one': values.get(stats_key(view_name, 'last_n_plus_one'), []),
+        })
+    return sorted(report, key=lambda row: row['queries'], reverse=True)
+
+
+def reset_view_stats():
+    cache.delete_many([stats_key(view_name, field) for view_name in set(url_view_names())
+                       for field in SQL_STATS_COUNTERS + ('max_queries', 'last_n_plus_one')])
+
+
+class SQLInstrumentationMiddleware:
+    """Count the SQL of each request, see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'SQL_INSTRUMENTATION', True)
+        self.threshold = getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 10)
+        self.server_timing = getattr(settings, 'SQL_SERVER_TIMING', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = QueryStats(self.threshold)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        # Query counts and timings tell an outsider too much, only staff see them by default
+        if self.server_timing or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = (f'db;dur={stats.duration * 1000:.1f};desc="{stats.queries} queries", '
+                                         f'total;dur={total * 1000:.1f}')
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        for sample in stats.n_plus_one:
+            logger.warning("Likely N+1 in %s: %d x %s at %s", view_name or request.path,
+                           stats.repeats(sample['sql']), sample['sql'], sample['call_site'])
+        if view_name:
+            try:
+                record_view_stats(view_name, stats)
+            except Exception:
+                # Instrumentation must never fail the request
+                logger.exception("Failed to record SQL stats for %s", view_name)
+        return response
+
+
+@login_required
+@require_http_methods(["GET", "DELETE"])
+def api_sql_report(request):
+    """Per-view query counts, SQL time and N+1 samples since the last reset (DELETE resets)
+
+    The counters live in the default cache: with a per-process cache (the local
+    memory default) this is only the answering worker's share, configure a shared
+    CACHES backend (Redis, Memcached, database) to see every worker's.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    if request.method == 'DELETE':
+        reset_view_stats()
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': True, 'data': {
+        'n_plus_one_threshold': getattr(settings, 'SQL_N_PLUS_ONE_THRESHOLD', 10),
+        'views': view_report(),
+    }})
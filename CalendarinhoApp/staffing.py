@@ -0,0 +1,179 @@
+"""
+Staffing recommendations for an engagement window
+Every active employee is scored at once from a handful of grouped queries turned
+into numpy arrays: free business days, current workload, experience with the
+service type and client, and leave in the window
+"""
+
+import datetime
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .models import Engagement, Leave
+from .business_days import is_busday
+from users.models import CustomUser as Employee
+
+# Weight of each normalized (0..1) component in the score, workload and leave count against
+SCORE_WEIGHTS = {
+    'availability': 0.5,
+    'service_experience': 0.2,
+    'client_experience': 0.15,
+    'workload': -0.1,
+    'leave': -0.05,
+}
+# Past engagements at which experience counts as half of its maximum
+EXPERIENCE_HALF_POINT = 2
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 100
+# Longest engagement window ranked, availability is scored on an employees x days grid
+STAFFING_MAX_DAYS = 366
+
+
+def day_offsets(starts, ends, window_start, days):
+    """Clip inclusive date ranges to the window as [start, end) day offsets"""
+    origin = np.datetime64(window_start, 'D')
+    start = np.clip((np.array(starts, dtype='datetime64[D]') - origin).astype(np.int64), 0, days)
+    end = np.clip((np.array(ends, dtype='datetime64[D]') - origin).astype(np.int64) + 1, 0, days)
+    return start, end
+
+
+def coverage(rows, starts, ends, window_start, shape):
+    """Per employee x day count of bookings covering the day, built with a difference array"""
+    diff = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+    if len(rows):
+        start, end = day_offsets(starts, ends, window_start, shape[1])
+        np.add.at(diff, (rows, start), 1)
+        np.add.at(diff, (rows, end), -1)
+    return np.cumsum(diff[:, :-1], axis=1)
+
+
+def saturate(counts, half_point=EXPERIENCE_HALF_POINT):
+    return counts / (counts + half_point)
+
+
+def recommend_staff(start_date, end_date, service_type_id=None, client_id=None, engagement_id=None,
+                    k=DEFAULT_TOP_K):
+    """Top k active employees for the window, best first, with the components of their score
+
+    Members of engagement_id are not recommended again and the engagement does
+    not count against anyone's availability or experience.
+    """
+    employees = Employee.objects.filter(is_active=True).order_by('first_name', 'last_name')
+    if engagement_id:
+        employees = employees.exclude(engagements__id=engagement_id)
+    employees = list(employees.values_list('id', 'first_name', 'last_name'))
+    if not employees:
+        return []
+
+    ids = np.array([emp[0] for emp in employees])
+    index = {emp_id: row for row, emp_id in enumerate(ids.tolist())}
+    days = (end_date - start_date).days + 1
+    window = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+    business = is_busday(window)
+    business_days = int(business.sum())
+
+    other_engagements = Engagement.objects.order_by().filter(employees__in=list(index))
+    if engagement_id:
+        other_engagements = other_engagements.exclude(id=engagement_id)
+
+    # Engagement bookings and leaves in the window
+    booked = list(other_engagements.filter(start_date__lte=end_date, end_date__gte=start_date)
+                  .values_list('employees', 'start_date', 'end_date'))
+    leaves = list(Leave.objects.order_by().filter(employee_id__in=list(index), start_date__lte=end_date,
+                                                   end_date__gte=start_date)
+                  .values_list('employee_id', 'start_date', 'end_date'))
+    engagement_days = coverage([index[row[0]] for row in booked], [row[1] for row in booked],
+                               [row[2] for row in booked], start_date, (len(ids), days))
+    leave_days = coverage([index[row[0]] for row in leaves], [row[1] for row in leaves],
+                          [row[2] for row in leaves], start_date, (len(ids), days))
+
+    busy = (engagement_days > 0) | (leave_days > 0)
+    free_business_days = (~busy & business).sum(axis=1)
+    leave_business_days = ((leave_days > 0) & business).sum(axis=1)
+
+    # Workload and history in one grouped query
+    today = timezone.now().date()
+    counts = {'active': Count('id', filter=Q(start_date__lte=today, end_date__gte=today))}
+    if service_type_id:
+        counts['service'] = Count('id', filter=Q(service_type_id=service_type_id))
+    if client_id:
+        counts['client'] = Count('id', filter=Q(client_id=client_id))
+    active = np.zeros(len(ids), dtype=np.int64)
+    service_experience = np.zeros(len(ids), dtype=np.int64)
+    client_experience = np.zeros(len(ids), dtype=np.int64)
+    for row in other_engagements.values('employees').annotate(**counts):
+        position = index[row['employees']]
+        active[position] = row['active']
+        service_experience[position] = row.get('service', 0)
+        client_experience[position] = row.get('client', 0)
+
+    components = {
+        'availability': free_business_days / business_days if business_days else np.ones(len(ids)),
+        'service_experience': saturate(service_experience),
+        'client_experience': saturate(client_experience),
+        'workload': active / active.max() if active.max() else np.zeros(len(ids)),
+        'leave': leave_business_days / business_days if business_days else np.zeros(len(ids)),
+    }
+    scores = sum(SCORE_WEIGHTS[name] * values for name, values in components.items())
+
+    k = min(k, len(ids))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.lexsort((top, -scores[top]))]
+
+    return [{
+        'id': int(ids[row]),
+        'full_name': f"{employees[row][1]} {employees[row][2]}".strip(),
+        'score': round(float(scores[row]), 4),
+        'business_days': business_days,
+        'free_business_days': int(free_business_days[row]),
+        'leave_business_days': int(leave_business_days[row]),
+        'active_engagements': int(active[row]),
+        'service_experience': int(service_experience[row]),
+        'client_experience': int(client_experience[row]),
+        'components': {name: round(float(values[row]), 4) for name, values in components.items()},
+    } for row in top]
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_staffing_recommendations(request):
+    """Rank employees for an engagement (engagement_id) or a planned one (start_date, end_date,
+    service_type and client); k limits the number returned"""
+    if not (request.user.is_superuser or request.user.user_type == 'M'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        k = max(1, min(int(request.GET.get('k', DEFAULT_TOP_K)), MAX_TOP_K))
+        if request.GET.get('engagement_id'):
+            engagement = get_object_or_404(Engagement, id=int(request.GET['engagement_id']))
+            start_date, end_date = engagement.start_date, engagement.end_date
+            service_type_id, client_id = engagement.service_type_id, engagement.client_id
+            engagement_id = engagement.id
+        else:
+            start_date = datetime.datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+            service_type_id = int(request.GET['service_type']) if request.GET.get('service_type') else None
+            client_id = int(request.GET['client']) if request.GET.get('client') else None
+            engagement_id = None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid engagement_id, dates, service_type, client or k'},
+                            status=400)
+    if end_date < start_date:
+        return JsonResponse({'success': False, 'error': 'end_date is before start_date'}, status=400)
+    if (end_date - start_date).days >= STAFFING_MAX_DAYS:
+        return JsonResponse({'success': False, 'error': f'The window must be at most {STAFFING_MAX_DAYS} days'},
+                            status=400)
+
+    return JsonResponse({
+        'success': True,
+        'start_date': start_date,
+        'end_date': end_date,
+        'weights': SCORE_WEIGHTS,
+        'recommendations': recommend_staff(start_date, end_date, service_type_id, client_id, engagement_id, k),
+    })
@@ -0,0 +1,107 @@
+"""
+Content-addressed storage for report files
+Blobs are stored under their SHA-256 in hash-sharded directories, so identical
+uploads share one file and no directory grows without bound
+"""
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the development server runs a single process
+    fcntl = None
+
+BLOB_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files <dir>/ab/cd/<sha256><ext> after their content.
+
+    The upload_to directory and extension of the requested name are kept, the
+    rest of the name is replaced by the digest. Saving content that is already
+    stored returns the existing blob instead of writing a copy.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_depth = threading.local()
+
+    @contextmanager
+    def blob_lock(self):
+        """Exclusive lock, across processes, between storing a blob and deleting an unreferenced one
+
+        Reentrant within a thread.
+        """
+        depth = getattr(self._lock_depth, 'value', 0)
+        if depth:
+            self._lock_depth.value = depth + 1
+            try:
+                yield
+            finally:
+                self._lock_depth.value = depth
+            return
+        os.makedirs(self.location, exist_ok=True)
+        with open(self.path('.blobs.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._lock_depth.value = 1
+            try:
+                yield
+            finally:
+                self._lock_depth.value = 0
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save; an existing name is the same blob
+        return name
+
+    def blob_name(self, directory, digest, extension):
+        return '/'.join(part for part in (directory, digest[:2], digest[2:4], digest + extension) if part)
+
+    def is_blob_name(self, name):
+        return bool(name and BLOB_NAME_RE.search(name))
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+
+        # Stream into a temp file next to the blobs so the final rename is atomic
+        os.makedirs(self.path(directory), exist_ok=True)
+        temp_path = self.path(os.path.join(directory, f".{uuid.uuid4().hex}.tmp"))
+        digest = hashlib.sha256()
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            blob = self.blob_name(directory, digest.hexdigest(), extension)
+            blob_path = self.path(blob)
+            if os.path.exists(blob_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_path, blob_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(blob_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return blob
+
+
+report_storage = ContentAddressedStorage()
+
+
+def get_report_storage():
+    return report_storage
@@ -18,6 +18,12 @@ def return_id(l, i):
     except:
         return ""
 
+@register.simple_tag(takes_context=True)
+def ics_feed_url(context, kind, object_id=None):
+    """Subscription URL of an employee, client or team ICS feed for the current user"""
+    from CalendarinhoApp.ics_feeds import feed_url
+    return feed_url(context['request'], kind, object_id)
+
 @register.filter
 def render_mentions(comment_body):
     """
@@ -5,9 +5,27 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import datetime
+import gc
+import hashlib
+import os
+import shutil
+import tempfile
+import tracemalloc
+import uuid
+from unittest import mock
+
 import django
-from django.test import TestCase
-from .models import Engagement, Comment, Service, Report, Leave, Client
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import (Engagement, Comment, Service, Report, Leave, Client, ReportUpload, SLAPolicy, Vulnerability,
+                     VulnerabilityRollup)
+from .request_memo import _memo
+from users.models import CustomUser as Employee
 
 # TODO: Configure your database in settings.py and sync before running tests.
 
@@ -24,4 +42,217 @@ class SimpleTest(TestCase):
         """
         Tests that 1 + 1 always equals 2.
         """
-        self.assertEqual(1 + 1, 2)
\ No newline at end of file
+        self.assertEqual(1 + 1, 2)
+
+
+class ChunkedReportUploadTest(TestCase):
+    """Tests for the chunked report upload API."""
+    # A multi-hundred-MB synthetic file in browser-sized chunks, memory must stay far below the file size
+    # A multi-hundred-MB file in chunks the size browser uploaders use, the ceiling is one chunk of headroom over two
+    CHUNK_SIZE = 2 * 1024 * 1024
+    FILE_SIZE = 256 * 1024 * 1024
+    MEMORY_CEILING = 8 * 1024 * 1024
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.upload_dir = tempfile.mkdtemp()
+        overrides = override_settings(MEDIA_ROOT=self.media_root, REPORT_UPLOAD_TEMP_DIR=self.upload_dir,
+                                      REPORT_UPLOAD_CHUNK_SIZE=self.CHUNK_SIZE,
+                                      REPORT_UPLOAD_MAX_SIZE=self.FILE_SIZE)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        notify = mock.patch('CalendarinhoApp.api_uploads.notifyNewReportUpload')
+        notify.start()
+        self.addCleanup(notify.stop)
+
+        self.user = Employee.objects.create_user(username='uploader', password='pass', email='uploader@example.com')
+        client = Client.objects.create(name='Upload Client', acronym='UC')
+        service = Service.objects.create(name='Upload Service', short_name='US')
+        today = datetime.date.today()
+        self.engagement = Engagement.objects.create(name='Upload Engagement', client=client, service_type=service,
+                                                    start_date=today, end_date=today)
+        self.client.force_login(self.user)
+
+    def synthetic_chunk(self, index, size):
+        return hashlib.sha256(str(index).encode()).digest() * (size // 32)
+
+    def init_upload(self, size, **extra):
+        response = self.client.post(reverse('CalendarinhoApp:api_report_upload_init', args=[self.engagement.id]),
+                                    {'filename': 'report.gpg', 'size': size, 'report_type': 'Final', **extra},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+
+    def put_chunk(self, upload_id, offset, data, total):
+        return self.client.put(reverse('CalendarinhoApp:api_report_upload_chunk', args=[upload_id]), data,
+                               content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {offset}-{offset + len(data) - 1}/{total}')
+
+    def test_large_upload_stays_under_memory_ceiling(self):
+        upload_id = self.init_upload(self.FILE_SIZE)
+        expected = hashlib.sha256()
+
+        tracemalloc.start()
+        try:
+            for index, offset in enumerate(range(0, self.FILE_SIZE, self.CHUNK_SIZE)):
+                chunk = self.synthetic_chunk(index, self.CHUNK_SIZE)
+                expected.update(chunk)
+                response = self.put_chunk(upload_id, offset, chunk, self.FILE_SIZE)
+                self.assertEqual(response.status_code, 200)
+                # The test client keeps each request payload alive in reference cycles
+                del chunk, response
+                gc.collect()
+            response = self.client.post(reverse('CalendarinhoApp:api_report_upload_finalize', args=[upload_id]),
+                                        {'sha256': expected.hexdigest()}, content_type='application/json')
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(peak, self.MEMORY_CEILING)
+        report = Report.objects.get(reference=response.json()['reference'])
+        self.assertEqual(report.file.size, self.FILE_SIZE)
+        self.assertFalse(ReportUpload.objects.exists())
+
+    def test_out_of_order_chunk_and_digest_mismatch(self):
+        data = self.synthetic_chunk(0, 1024)
+        upload_id = self.init_upload(len(data), sha256='0' * 64)
+
+        response = self.put_chunk(upload_id, 512, data[512:], len(data))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 0)
+
+        self.assertEqual(self.put_chunk(upload_id, 0, data[:512], len(data)).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 512, data[512:], len(data)).status_code, 200)
+
+        response = self.client.post(reverse('CalendarinhoApp:api_report_upload_finalize', args=[upload_id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertFalse(Report.objects.exists())
+        self.assertFalse(ReportUpload.objects.exists())
+
+    def test_shared_blob_is_deleted_with_its_last_report(self):
+        self.engagement.name = 'Web/API'
+        self.engagement.save()
+        data = self.synthetic_chunk(0, 1024)
+        names = []
+        for _ in range(2):
+            upload_id = self.init_upload(len(data))
+            self.assertEqual(self.put_chunk(upload_id, 0, data, len(data)).status_code, 200)
+            response = self.client.post(reverse('CalendarinhoApp:api_report_upload_finalize', args=[upload_id]))
+            self.assertEqual(response.status_code, 201)
+            names.append(Report.objects.get(reference=response.json()['reference']).file.name)
+
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(names, [f"Reports/{digest[:2]}/{digest[2:4]}/{digest}.gpg"] * 2)
+        path = os.path.join(self.media_root, names[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Report.objects.filter(pk=Report.objects.first().pk).delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.engagement.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_stale_uploads_are_purged(self):
+        stale_id = self.init_upload(1024)
+        ReportUpload.objects.filter(id=stale_id).update(
+            updated_at=timezone.now() - datetime.timedelta(hours=settings.REPORT_UPLOAD_TTL_HOURS + 1))
+        fresh_id = self.init_upload(1024)
+
+        self.assertEqual(list(ReportUpload.objects.values_list('id', flat=True)), [uuid.UUID(fresh_id)])
+        self.assertEqual(os.listdir(self.upload_dir), [f"{fresh_id}.part"])
+
+
+class DashboardQueryBudgetTest(TestCase):
+    """The landing dashboard costs the same few queries whatever the team and history size."""
+
+    # Session, user, the dashboard snapshot and the context processors
+    QUERY_BUDGET = 12
+
+    def setUp(self):
+        self.user = Employee.objects.create_user(username='budget', email='budget@example.com', password='x',
+                                                 first_name='Budget', last_name='User')
+        self.client_obj = Client.objects.create(name='Budget Client', acronym='BC', code='BC1')
+        self.service = Service.objects.create(name='Budget Service')
+        self.client.force_login(self.user)
+
+    def add_team(self, size):
+        today = datetime.date.today()
+        for index in range(size):
+            employee = Employee.objects.create_user(username=f'budget{size}-{index}',
+                                                    email=f'budget{size}-{index}@example.com', password='x')
+            engagement = Engagement.objects.create(
+                name=f'Budget {size}-{index}', client=self.client_obj, service_type=self.service,
+                start_date=today - datetime.timedelta(days=index), end_date=today + datetime.timedelta(days=index))
+            engagement.employees.add(employee)
+            if index % 3 == 0:
+                Leave.objects.create(employee=employee, note='Budget', leave_type='Training',
+                                     start_date=today, end_date=today)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('CalendarinhoApp:Dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET,
+                             '\n'.join(query['sql'] for query in queries.captured_queries))
+        return len(queries)
+
+    def test_dashboard_query_count_is_constant(self):
+        self.add_team(2)
+        small = self.dashboard_queries()
+        self.add_team(30)
+        self.assertEqual(self.dashboard_queries(), small)
+
+    def test_dashboard_figures(self):
+        self.add_team(6)
+        statistics = self.client.get(reverse('CalendarinhoApp:Dashboard')).context['statistics']
+        self.assertEqual(statistics['numberOfEmployees'], 7)
+        self.assertEqual(statistics['pieChartStatus'], {'available': 1, 'engaged': 4, 'training': 2, 'vacation': 0})
+        self.assertEqual(statistics['availabilityPercentage'], '86%')
+        self.assertEqual(statistics['ongoingEngagements'], 6)
+        self.assertEqual(list(statistics['cliBars'].values()), [6])
+        self.assertEqual(len(statistics['engagementsBars']), 6)
+
+
+class VulnerabilityRollupTest(TestCase):
+    """Rollups are built once on first read and then reused by the instance."""
+
+    def test_missing_rollup_is_built_once(self):
+        client = Client.objects.create(name='Rollup Client', acronym='RC', code='RC1')
+        service = Service.objects.create(name='Rollup Service')
+        engagement = Engagement.objects.create(name='Rollup', client=client, service_type=service,
+                                               start_date=datetime.date.today(), end_date=datetime.date.today())
+        VulnerabilityRollup.objects.all().delete()
+        engagement = Engagement.objects.get(pk=engagement.pk)
+        client = Client.objects.get(pk=client.pk)
+
+        self.assertEqual(VulnerabilityRollup.for_engagement(engagement).risk_score, 0)
+        self.assertEqual(VulnerabilityRollup.for_client(client).risk_score, 0)
+        with self.assertNumQueries(0):
+            VulnerabilityRollup.for_engagement(engagement)
+            VulnerabilityRollup.for_client(client)
+
+
+class SLAPolicyRulesMemoTest(TestCase):
+    """Per-row is_overdue() calls read the SLA policies once per request."""
+
+    def test_rules_are_read_once_per_request(self):
+        client = Client.objects.create(name='SLA Client', acronym='SC', code='SC1')
+        service = Service.objects.create(name='SLA Service')
+        engagement = Engagement.objects.create(name='SLA', client=client, service_type=service,
+                                               start_date=datetime.date.today(), end_date=datetime.date.today())
+        employee = Employee.objects.create_user(username='sla', password='sla-password')
+        for number in range(3):
+            Vulnerability.objects.create(title=f'Finding {number}', description='-', engagement=engagement,
+                                         created_by=employee)
+        SLAPolicy.objects.create(severity='Medium', days=0, client=client)
+        vulnerabilities = list(Vulnerability.objects.select_related('engagement'))
+
+        token = _memo.set({})
+        try:
+            with self.assertNumQueries(1):
+                self.assertEqual([vuln.is_overdue() for vuln in vulnerabilities], [False] * 3)
+        finally:
+            _memo.reset(token)
@@ -0,0 +1,129 @@
+"""
+Resource timeline (Gantt) of employees over a window of days
+Engagement assignments and leaves are painted onto an employees x days grid from two
+interval queries, then every row is run-length encoded into segments returned as
+parallel arrays, so a year of 300 employees stays a small response
+"""
+
+import datetime
+
+import numpy as np
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .models import DailyOccupancy, Engagement, Leave
+from users.models import CustomUser as Employee
+
+# Segment kinds, a segment's kind is its index in this tuple plus one (0 is free)
+TIMELINE_KINDS = (DailyOccupancy.ENGAGED,) + tuple(leave_type for leave_type, _ in Leave.LEAVE_TYPES)
+TIMELINE_DEFAULT_DAYS = 365
+TIMELINE_MAX_DAYS = 366
+
+
+def day_span(start, end, window_start, days):
+    """Inclusive dates clipped to the window as a [first, last) slice of day offsets"""
+    return max((start - window_start).days, 0), min((end - window_start).days + 1, days)
+
+
+def run_length_encode(kinds, refs):
+    """Segments of equal (kind, ref) cells in each row of the grids, free cells left out
+
+    Returns (offsets, starts, lengths, kinds, refs): the segments of row i are
+    offsets[i]:offsets[i + 1] of the other arrays, ordered by start.
+    """
+    rows, days = kinds.shape
+    change = np.ones((rows, days), dtype=bool)
+    change[:, 1:] = (kinds[:, 1:] != kinds[:, :-1]) | (refs[:, 1:] != refs[:, :-1])
+    # Row major, and every row starts with a change so no run crosses rows
+    row, start = np.nonzero(change)
+    lengths = np.diff(np.append(row * days + start, rows * days))
+    busy = kinds[row, start] != 0
+    row, start, lengths = row[busy], start[busy], lengths[busy]
+    offsets = np.searchsorted(row, np.arange(rows + 1))
+    return offsets, start, lengths, kinds[row, start], refs[row, start]
+
+
+def employee_timeline(start_date, end_date, employee_ids=None):
+    """Run-length encoded engagements and leaves of employees (default: active ones) between the dates
+
+    When bookings overlap a leave wins over an engagement and a later
+    engagement over an earlier one, as on the employee's current status.
+    """
+    employees = Employee.objects.filter(is_active=True)
+    if employee_ids is not None:
+        employees = Employee.objects.filter(id__in=employee_ids)
+    employees = list(employees.order_by('first_name', 'last_name').values_list('id', 'first_name', 'last_name'))
+    index = {emp_id: row for row, (emp_id, _, _) in enumerate(employees)}
+    days = (end_date - start_date).days + 1
+    kinds = np.zeros((len(employees), days), dtype=np.int8)
+    refs = np.zeros((len(employees), days), dtype=np.int64)
+
+    engagement_names = {}
+    assignments = Engagement.objects.order_by('start_date', 'id').filter(
+        employees__in=list(index), start_date__lte=end_date, end_date__gte=start_date,
+    ).values_list('employees', 'id', 'name', 'start_date', 'end_date')
+    for employee_id, eng_id, name, eng_start, eng_end in assignments:
+        engagement_names[eng_id] = name
+        first, last = day_span(eng_start, eng_end, start_date, days)
+        kinds[index[employee_id], first:last] = 1
+        refs[index[employee_id], first:last] = eng_id
+
+    leaves = Leave.objects.order_by('start_date', 'id').filter(
+        employee_id__in=list(index), start_date__lte=end_date, end_date__gte=start_date,
+    ).values_list('employee_id', 'id', 'leave_type', 'start_date', 'end_date')
+    for employee_id, leave_id, leave_type, leave_start, leave_end in leaves:
+        first, last = day_span(leave_start, leave_end, start_date, days)
+        kinds[index[employee_id], first:last] = TIMELINE_KINDS.index(leave_type) + 1
+        refs[index[employee_id], first:last] = leave_id
+
+    offsets, starts, lengths, segment_kinds, segment_refs = run_length_encode(kinds, refs)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': days,
+        'kinds': TIMELINE_KINDS,
+        'employees': {
+            'id': [emp[0] for emp in employees],
+            'name': [f"{emp[1]} {emp[2]}".strip() for emp in employees],
+        },
+        'segments': {
+            'offsets': offsets.tolist(),
+            'start': starts.tolist(),
+            'length': lengths.tolist(),
+            'kind': segment_kinds.tolist(),
+            'ref': segment_refs.tolist(),
+        },
+        'engagements': engagement_names,
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_employee_timeline(request):
+    """Gantt timeline between ?start_date and ?end_date (default the next 365 days), optionally for
+    ?employees (comma separated ids)
+
+    The segments of employee i are segments.offsets[i] to segments.offsets[i + 1]
+    of the segment arrays: start is a day offset from start_date, kind an index
+    into kinds plus one and ref the engagement or leave id.
+    """
+    if not (request.user.is_superuser or request.user.user_type == 'M'):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        start_date = (datetime.date.fromisoformat(request.GET['start_date']) if request.GET.get('start_date')
+                      else timezone.now().date())
+        end_date = (datetime.date.fromisoformat(request.GET['end_date']) if request.GET.get('end_date')
+                    else start_date + datetime.timedelta(days=TIMELINE_DEFAULT_DAYS - 1))
+        employee_ids = None
+        if request.GET.get('employees'):
+            employee_ids = [int(value) for value in request.GET['employees'].split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid dates or employee ids'}, status=400)
+    if end_date < start_date or (end_date - start_date).days >= TIMELINE_MAX_DAYS:
+        return JsonResponse({'success': False, 'error': f'The window must be 1 to {TIMELINE_MAX_DAYS} days'},
+                            status=400)
+
+    return JsonResponse({'success': True, 'data': employee_timeline(start_date, end_date, employee_ids)})
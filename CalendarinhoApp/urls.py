@@ -12,6 +12,15 @@ from . import api_performance
 from . import api_mobile
 from . import api_docs
 from . import api_inline_edit
+from . import api_uploads
+from . import staffing
+from . import forecasting
+from . import calendar_feeds
+from . import ics_feeds
+from . import timeline
+from . import heatmap
+from . import sql_instrumentation
+from . import metrics
 from django.urls import re_path
 from django.contrib.auth import views as auth_views
 from django.urls import reverse_lazy
@@ -37,6 +46,10 @@ urlpatterns = [
     path('EmployeesCalendar/overlap/', employee.overlap, name='Overlap'),
     path('Leave/add', employee.LeaveCreate, name='LeaveCreate'),
     path('LeavesCalendar/', employee.LeavesCal, name='LeavesCal'),
+    path('api/calendar/engagements/', calendar_feeds.api_engagement_events, name='api_engagement_events'),
+    path('api/calendar/leaves/', calendar_feeds.api_leave_events, name='api_leave_events'),
+    path('api/calendar/employees/', calendar_feeds.api_employee_events, name='api_employee_events'),
+    path('ics/<str:token>.ics', ics_feeds.ics_feed, name='ics_feed'),
     path('exportcsv/<int:empID>', views.exportCSV, name='exportCSV'),
     path('exportcsv/<slug:slug>', views.exportCSV, name='exportCSV'),
     path('exportcsv/', views.exportCSV, name='exportCSV'),
@@ -70,7 +83,10 @@ urlpatterns = [
     path('api/mobile-data/', api_filters.api_mobile_optimized_data, name='api_mobile_optimized_data'),
     path('api/filter-options/', api_filters.api_filter_options, name='api_filter_options'),
     path('api/vulnerability-analytics/', service.api_vulnerability_analytics, name='api_vulnerability_analytics'),
+    path('api/vulnerability-cube/', service.api_vulnerability_cube, name='api_vulnerability_cube'),
     path('api/performance-metrics/', service.api_performance_metrics, name='api_performance_metrics'),
+    path('api/sql-report/', sql_instrumentation.api_sql_report, name='api_sql_report'),
+    path('metrics', metrics.metrics_view, name='metrics'),
     path('api/search-suggestions/', service.api_search_suggestions, name='api_search_suggestions'),
     
     # Vulnerability management endpoints
@@ -110,12 +126,22 @@ urlpatterns = [
     path('api/client/<int:client_id>/edit-field/', api_inline_edit.update_client_field, name='api_update_client_field'),
     path('api/comment/<int:comment_id>/edit-field/', api_inline_edit.update_comment_field, name='api_update_comment_field'),
     path('api/vulnerabilities/batch-edit/', api_inline_edit.batch_update_vulnerabilities, name='api_batch_update_vulnerabilities'),
+
+    # Chunked Report Upload API
+    path('api/engagement/<int:eng_id>/report-uploads/', api_uploads.api_report_upload_init, name='api_report_upload_init'),
+    path('api/report-uploads/<uuid:upload_id>/', api_uploads.api_report_upload_status, name='api_report_upload_status'),
+    path('api/report-uploads/<uuid:upload_id>/chunk/', api_uploads.api_report_upload_chunk, name='api_report_upload_chunk'),
+    path('api/report-uploads/<uuid:upload_id>/finalize/', api_uploads.api_report_upload_finalize, name='api_report_upload_finalize'),
     
     # Services API
     path('api/services/', api_inline_edit.get_services, name='api_get_services'),
     
     # Employee Management API for Inline Editing
     path('api/employees/available/', api_inline_edit.get_available_employees, name='api_get_available_employees'),
+    path('api/staffing/recommendations/', staffing.api_staffing_recommendations, name='api_staffing_recommendations'),
+    path('api/capacity-forecast/', forecasting.api_capacity_forecast, name='api_capacity_forecast'),
+    path('api/timeline/', timeline.api_employee_timeline, name='api_employee_timeline'),
+    path('api/occupancy-heatmap/', heatmap.api_occupancy_heatmap, name='api_occupancy_heatmap'),
     path('api/engagement/<int:eng_id>/employees/', api_inline_edit.get_engagement_employees, name='api_get_engagement_employees'),
     path('api/engagement/<int:eng_id>/add-employee/', api_inline_edit.add_employee_to_engagement, name='api_add_employee_to_engagement'),
     path('api/engagement/<int:eng_id>/remove-employee/', api_inline_edit.remove_employee_from_engagement, name='api_remove_employee_from_engagement'),
@@ -146,7 +172,8 @@ urlpatterns = [
     path('forgetpasswordOTP',authentication.forgetpasswordOTP, name='forgetpasswordOTP'),
     path('forgetpasswordEnd',authentication.forgetpasswordEnd, name='forgetpasswordEnd'),
 
-    path("ToggleTheme",views.toggleTheme, name="ToggleTheme")
+    path("ToggleTheme",views.toggleTheme, name="ToggleTheme"),
+    path("ToggleEmailDigest",views.toggleEmailDigest, name="ToggleEmailDigest")
 ]
 
 
@@ -5,6 +5,8 @@ from .forms import *
 import datetime
 import csv
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
+from django.utils.http import url_has_allowed_host_and_scheme
 import logging
 from django.conf import settings
 from datetime import timedelta, date
@@ -12,7 +14,6 @@ import calendar
 
 logger = logging.getLogger(__name__)
 from autocomplete.forms import EmployeeCounter
-from .employee import overlapPrecentage
 
 def not_found(request, exception=None):
     response = render(request, 'CalendarinhoApp/404.html', {})
@@ -21,42 +22,16 @@ def not_found(request, exception=None):
 
 @login_required
 def Dashboard(request):
-    # Use optimized service functions for better performance
-    from .service import get_dashboard_summary
-    
-    # Get optimized statistics
-    dashboard_stats = get_dashboard_summary()
-    
-    # Legacy engagement progress data (keep for compatibility)
-    engs = Engagement.objects.select_related('client').filter(
-        start_date__lte=datetime.date.today(),
-        end_date__gte=datetime.date.today()
-    )
-    engsTable = []
-    cliTable = {}
-    
-    for eng in engs:
-        precent = eng.days_left_percentage()
-        if precent != "Nope":
-            singleEng = {
-                'engid': eng.id,
-                'engName': eng.name,
-                'precent': precent,
-                'start_date': eng.start_date,
-                'end_date': eng.end_date
-            }
-            engsTable.append(singleEng)
-            cliTable[eng.client] = eng.client.count_current_engagements()
-    
-    engsTable = sorted(engsTable, key=lambda i: i['precent'])
-    cliTable = {k: v for k, v in sorted(cliTable.items(), key=lambda item: item[1], reverse=True)}
-    
-    # Enhanced statistics with optimized data
+    # Every figure comes from one pass over bulk-loaded intervals
+    from .service import get_dashboard_snapshot
+
+    dashboard_stats = get_dashboard_snapshot()
+
     statistics = {
         'upcomingEngagements': dashboard_stats['engagements']['upcoming'],
         'ongoingEngagements': dashboard_stats['engagements']['ongoing'],
         'completedEngagements': dashboard_stats['engagements']['completed'],
-        'availabilityPercentage': overlapPrecentage(request),
+        'availabilityPercentage': dashboard_stats['availability'],
         'numberOfEmployees': dashboard_stats['employees']['total'],
         'teamUtilization': dashboard_stats['utilization'],
         'activeClients': dashboard_stats['clients']['active'],
@@ -67,8 +42,8 @@ def Dashboard(request):
             'training': dashboard_stats['employees']['training'],
             'vacation': dashboard_stats['employees']['vacation']
         },
-        'engagementsBars': engsTable,
-        'cliBars': cliTable
+        'engagementsBars': dashboard_stats['engagement_bars'],
+        'cliBars': dashboard_stats['client_bars']
     }
     
     context = {'statistics': statistics}
@@ -128,7 +103,7 @@ def managerDashboard(request):
             # Get client overview data
             from .models import Client
             client_overview_list = []
-            clients = Client.objects.all()
+            clients = Client.objects.select_related('vulnerability_rollup')
             for client in clients:
                 today = datetime.date.today()
                 active_engagements = client.engagements.filter(
@@ -351,46 +326,41 @@ def counterEmpSvc(request):
     #Only Managers and Superusers are allowed
     if(not request.user.is_superuser and not request.user.user_type == 'M'):
         return not_found(request)
-    else:
-        form = EmployeeCounter()
-        if (request.method == 'GET'):
-            countList = {}
-            for emp in Employee.objects.all().order_by('first_name'):
-                empCount = []
-                for srv in Service.objects.all():
-                    empCount.append(emp.countSrv(srv.id))
-                countList.update({emp:empCount})
-            
-            serviceList = Service.objects.all()
-            return render(request,"CalendarinhoApp/counterEmpSvc.html",{'form':form, 'countList':countList, 'serviceList':serviceList})
-        else:
-            countList = {}
-            
-            if(not request.POST.get("employees")):
-                for emp in Employee.objects.all().order_by('first_name'):
-                    countList.update({emp:''})
-            else:
-                empInputList = request.POST.getlist("employees")
-                for empID in empInputList:
-                    emp = Employee.objects.get(id=empID)
-                    countList.update({emp:''})
-            
-            serviceList = []
-            if(not request.POST.get("service_type")):
-                for serv in Service.objects.all():
-                    serviceList.append(serv)
-            else:
-                servInputList = request.POST.getlist("service_type")
-                for serv in servInputList:
-                    serviceList.append(Service.objects.get(id=serv))
-            
-            for emp in countList:
-                countSrvList = []
-                for serv in serviceList:
-                    countSrvList.append(emp.countSrv(serv.id))
-                countList.update({emp:countSrvList})
 
-            return render(request,"CalendarinhoApp/counterEmpSvc.html",{'form':form, 'countList':countList, 'serviceList':serviceList})
+    from .service import get_employee_service_matrix
+
+    employees = Employee.objects.all().order_by('first_name')
+    serviceList = Service.objects.all()
+    # The submitted filters, kept in the form so "Export CSV" exports the matrix shown
+    filters = {}
+    if (request.method == 'POST'):
+        if(request.POST.get("employees")):
+            filters['employees'] = request.POST.getlist("employees")
+            employees = employees.filter(id__in=filters['employees'])
+        if(request.POST.get("service_type")):
+            filters['service_type'] = request.POST.getlist("service_type")
+            serviceList = serviceList.filter(id__in=filters['service_type'])
+        for field in ('from_date', 'to_date'):
+            try:
+                filters[field] = datetime.datetime.strptime(request.POST.get(field, ''), '%Y-%m-%d').date()
+            except ValueError:
+                pass
+
+    employees = list(employees)
+    serviceList = list(serviceList)
+    matrix = get_employee_service_matrix(employees, serviceList, filters.get('from_date'), filters.get('to_date'))
+    countList = dict(zip(employees, matrix.tolist()))
+
+    if (request.POST.get("export") == "csv"):
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="Service-Involvement.csv"'
+        writer = csv.writer(response)
+        writer.writerow(['Name'] + [str(srv) for srv in serviceList])
+        writer.writerows([str(emp)] + counts for emp, counts in countList.items())
+        return response
+
+    form = EmployeeCounter(initial=filters)
+    return render(request,"CalendarinhoApp/counterEmpSvc.html",{'form':form, 'countList':countList, 'serviceList':serviceList})
 
 
 
@@ -441,6 +411,17 @@ def toggleTheme(request):
         response.set_cookie("theme","Dark",max_age=year_inSeconds)
     return response
 
+@login_required
+@require_POST
+def toggleEmailDigest(request):
+    request.user.email_digest = not request.user.email_digest
+    request.user.save(update_fields=['email_digest'])
+    referer = request.META.get('HTTP_REFERER')
+    if referer and url_has_allowed_host_and_scheme(referer, allowed_hosts={request.get_host()},
+                                                   require_https=request.is_secure()):
+        return redirect(referer)
+    return redirect("/Dashboard")
+
 def debug_inline(request):
     """Debug page for inline editing issues"""
     return render(request, 'CalendarinhoApp/debug_inline.html')
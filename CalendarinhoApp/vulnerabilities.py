@@ -57,22 +57,7 @@ def vulnerabilities_table(request):
     }
     
     # Overdue vulnerabilities count
-    today = timezone.now().date()
-    severity_sla = {
-        'Critical': 7,
-        'High': 30,
-        'Medium': 90,
-        'Low': 180
-    }
-    
-    overdue_count = 0
-    for severity, days in severity_sla.items():
-        cutoff_date = today - timezone.timedelta(days=days)
-        overdue_count += queryset.filter(
-            severity=severity,
-            status='Open',
-            created_at__date__lte=cutoff_date
-        ).count()
+    overdue_count = queryset.overdue().count()
     
     context = {
         'filter_form': filter_form,
@@ -90,7 +75,7 @@ def vulnerabilities_table(request):
 @login_required
 def vulnerability_detail(request, vuln_id):
     """Detailed view of a single vulnerability"""
-    vulnerability = get_object_or_404(Vulnerability, id=vuln_id)
+    vulnerability = get_object_or_404(Vulnerability.objects.with_sla(), id=vuln_id)
     
     # Check if user can view this vulnerability
     if not (request.user in vulnerability.engagement.employees.all() or 
@@ -102,18 +87,11 @@ def vulnerability_detail(request, vuln_id):
         id=vulnerability.id
     ).order_by('-created_at')[:5]
     
-    # Calculate SLA information
-    severity_sla = {
-        'Critical': 7,
-        'High': 30,
-        'Medium': 90,
-        'Low': 180
-    }
-    
-    sla_days = severity_sla.get(vulnerability.severity, 90)
+    # SLA information annotated from the SLA policies
+    sla_days = vulnerability.sla_days
     days_open = (timezone.now().date() - vulnerability.created_at.date()).days
-    is_overdue = vulnerability.status == 'Open' and days_open > sla_days
-    days_until_sla = max(0, sla_days - days_open) if vulnerability.status == 'Open' else 0
+    is_overdue = vulnerability.sla_overdue
+    days_until_sla = max(0, vulnerability.days_remaining.days) if vulnerability.status == 'Open' else 0
     
     context = {
         'vulnerability': vulnerability,
@@ -182,7 +160,7 @@ def engagement_vulnerabilities(request, eng_id):
         return not_found(request)
     
     # Get vulnerabilities for this engagement
-    vulnerabilities = engagement.vulnerabilities.select_related('created_by', 'fixed_by').all()
+    vulnerabilities = engagement.vulnerabilities.select_related('created_by', 'fixed_by').with_sla()
     
     # Apply filters if provided
     filter_form = VulnerabilityFilterForm(request.GET or None)
@@ -271,7 +249,7 @@ def client_vulnerabilities(request, cli_id):
     # Get all vulnerabilities for this client's engagements
     vulnerabilities = Vulnerability.objects.filter(
         engagement__client=client
-    ).select_related('engagement', 'created_by', 'fixed_by').all()
+    ).select_related('engagement', 'created_by', 'fixed_by').with_sla()
     
     # Apply filters if provided
     filter_form = VulnerabilityFilterForm(request.GET or None)
@@ -355,7 +333,7 @@ def get_vulnerability_export_data(vulnerability_ids):
     """Get vulnerability data formatted for export"""
     vulnerabilities = Vulnerability.objects.filter(
         id__in=vulnerability_ids
-    ).select_related('engagement__client', 'created_by', 'fixed_by')
+    ).select_related('engagement__client', 'created_by', 'fixed_by').with_sla()
     
     export_data = []
     for vuln in vulnerabilities:
@@ -38,6 +38,10 @@ class LeaveForm(forms.ModelForm): #Leave form for admin page
             raise forms.ValidationError("Dates are incorrect")
 
 class EmployeeCounter(autocomplete.FutureModelForm): #URL: /counterTable
+    # Only count engagements overlapping this period, either end may be left open
+    from_date = forms.DateField(required=False, input_formats=['%Y-%m-%d'], widget=forms.DateInput(attrs={'type': 'date', 'class': ' ml-1 mr-2'}))
+    to_date = forms.DateField(required=False, input_formats=['%Y-%m-%d'], widget=forms.DateInput(attrs={'type': 'date', 'class': ' ml-1 mr-2'}))
+
     class Meta:
         model = Engagement
         fields = ('employees', 'service_type',)
@@ -21,6 +21,7 @@ class CustomUserAdmin(UserAdmin):
         (None, {'fields': ('username', 'password')}),
         (_('Personal info'), {
          'fields': ('first_name', 'last_name', 'email', 'user_type')}),
+        (_('Notifications'), {'fields': ('email_digest',)}),
         (_('Permissions'), {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
         }),
@@ -1,9 +1,7 @@
-from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 import datetime
 from collections import namedtuple
-import numpy as np
 
 
 class EmailField(models.CharField):
@@ -56,6 +54,12 @@ class CustomUser(AbstractUser):
 
     date_quit = models.DateTimeField(null=True, blank=True)
 
+    # Notification delivery preference
+    email_digest = models.BooleanField(
+        default=False,
+        help_text="Bundle notification emails into one digest per coalescing window"
+    )
+
     def __str__(self):
         return self.first_name + " " + self.last_name
 
@@ -72,37 +76,22 @@ class CustomUser(AbstractUser):
             event_sub_arr = {}
             event_sub_arr['empName'] = self.first_name + " " + self.last_name 
             event_sub_arr['title'] = i.note + " - " + i.leave_type
-            start_date = datetime.datetime.strptime(
-                str(i.start_date), "%Y-%m-%d").strftime("%Y-%m-%d")
-            end_date = datetime.datetime.strptime(
-                str(i.end_date + datetime.timedelta(days=1)), "%Y-%m-%d").strftime("%Y-%m-%d")
-            event_sub_arr['start'] = start_date
-            event_sub_arr['end'] = end_date
+            event_sub_arr['start'] = i.start_date.isoformat()
+            event_sub_arr['end'] = (i.end_date + datetime.timedelta(days=1)).isoformat()
             event_sub_arr['id'] = i.id
-            if i.leave_type == "Vacation":
-                event_sub_arr['color'] = "#2C3E50"
-            elif i.leave_type == "Training":
-                event_sub_arr['color'] = "#2980B9"
-            elif i.leave_type == "Work from Home":
-                event_sub_arr['color'] = "#f39c12"
-            else:
-                event_sub_arr['color'] = "#2C3E50"
+            event_sub_arr['color'] = Leave.CALENDAR_COLORS.get(i.leave_type, "#2C3E50")
             event_arr.append(event_sub_arr)
         return event_arr
 
     def getAllEngagements(self):
         event_arr = []
-        all_engagements = self.engagements.all().order_by('start_date')
+        all_engagements = self.engagements.select_related('client', 'service_type').order_by('start_date')
         colors = ["#BD4932"]
         for i in all_engagements:
             event_sub_arr = {}
             event_sub_arr['name'] = i.name
-            start_date = datetime.datetime.strptime(
-                str(i.start_date), "%Y-%m-%d").strftime("%Y-%m-%d")
-            end_date = datetime.datetime.strptime(
-                str(i.end_date  + datetime.timedelta(days=1)), "%Y-%m-%d").strftime("%Y-%m-%d")
-            event_sub_arr['start_date'] = start_date
-            event_sub_arr['end_date'] = end_date
+            event_sub_arr['start_date'] = i.start_date.isoformat()
+            event_sub_arr['end_date'] = (i.end_date + datetime.timedelta(days=1)).isoformat()
             event_sub_arr['engID'] = i.id
             event_sub_arr['color'] = colors[0]
             event_sub_arr['service_type'] = i.service_type
@@ -372,26 +361,20 @@ class CustomUser(AbstractUser):
 
     # function to calculate the number of days in each engagement
     def countEngDays(self, start_date, end_date):
+        from CalendarinhoApp.business_days import clipped_busday_count
         start_date = datetime.datetime.strptime(str(start_date), "%Y-%m-%d").date()
         end_date = datetime.datetime.strptime(str(end_date), "%Y-%m-%d").date()
         engs = self.engagements.all().filter(end_date__gte=start_date).filter(start_date__lte=end_date)
-        noDays = 0
-        for eng in engs:
-            actStart = start_date if eng.start_date < start_date else eng.start_date
-            actEnd = eng.end_date if eng.end_date < end_date else end_date
-
-            countDays = np.busday_count(actStart, actEnd + datetime.timedelta(days=1), weekmask=settings.WORKING_DAYS)
-            noDays += countDays
-
-        return noDays
+        return clipped_busday_count(engs.values_list('start_date', 'end_date'), start_date, end_date)
     
     def get_utilization_rate(self, days=30):
         """Calculate employee utilization rate over the last N days"""
+        from CalendarinhoApp.business_days import busday_count
         end_date = datetime.date.today()
         start_date = end_date - datetime.timedelta(days=days)
         
         engaged_days = self.countEngDays(start_date, end_date)
-        total_working_days = np.busday_count(start_date, end_date + datetime.timedelta(days=1), weekmask=settings.WORKING_DAYS)
+        total_working_days = busday_count(start_date, end_date)
         
         if total_working_days == 0:
             return 0